@@ -0,0 +1,92 @@
+"""
+Подсказки по названию и модели товара при вводе.
+
+Совпадения ищутся по триграммам (``pg_trgm``): начало названия через ILIKE
+и нечеткое совпадение слова через оператор ``<%``; оба условия обслуживают
+GIN-индексы ``gin_trgm_ops``. Один и тот же товар разных магазинов (одна
+модель) выдается один раз. Самые частые префиксы кэшируются в процессе.
+"""
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+from backend.models import Product, Shop
+
+# повторы моделей убираются только среди лучших %(candidates)s совпадений,
+# а не среди всех строк, подходящих под короткий префикс
+AUTOCOMPLETE_SQL = """
+    SELECT name, model FROM (
+        SELECT DISTINCT ON (model) name, model, is_prefix, score FROM (
+            SELECT p.id, p.name, p.model,
+                   p.name ILIKE %(prefix)s AS is_prefix,
+                   greatest(word_similarity(%(text)s, p.name), word_similarity(%(text)s, p.model)) AS score
+            FROM {product} p
+            JOIN {shop} s ON s.id = p.shop_id
+            WHERE p.is_active AND s.state
+              AND (p.name ILIKE %(prefix)s OR %(text)s <%% p.name OR %(text)s <%% p.model)
+              {scope}
+            ORDER BY is_prefix DESC, score DESC, p.id
+            LIMIT %(candidates)s
+        ) candidates
+        ORDER BY model, is_prefix DESC, score DESC, id
+    ) matches
+    ORDER BY is_prefix DESC, score DESC, name
+    LIMIT %(limit)s
+"""
+
+# запросы короче не дают осмысленных триграмм, а под префикс из двух букв подходит почти весь каталог
+MIN_LENGTH = 3
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def like_prefix(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def find_suggestions(text, shop_id=None, category_id=None, limit=None):
+    """
+    Список пар (название, модель) для введенного текста, без кэша
+    """
+    limit = limit or settings.PRODUCTS_AUTOCOMPLETE_LIMIT
+    params = {'text': text, 'prefix': like_prefix(text), 'limit': limit,
+              'candidates': max(settings.PRODUCTS_AUTOCOMPLETE_CANDIDATES, limit)}
+    scope = ''
+    if shop_id is not None:
+        scope += ' AND p.shop_id = %(shop_id)s'
+        params['shop_id'] = shop_id
+    if category_id is not None:
+        scope += ' AND p.category_id = %(category_id)s'
+        params['category_id'] = category_id
+
+    sql = AUTOCOMPLETE_SQL.format(product=Product._meta.db_table, shop=Shop._meta.db_table, scope=scope)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+@lru_cache(maxsize=settings.PRODUCTS_AUTOCOMPLETE_CACHE_SIZE)
+def _cached_suggestions(text, shop_id, category_id, limit, period):
+    # period меняется раз в PRODUCTS_AUTOCOMPLETE_CACHE_TTL секунд, и старые записи перестают совпадать
+    return tuple(find_suggestions(text, shop_id, category_id, limit))
+
+
+def suggest(text, shop_id=None, category_id=None, limit=None):
+    """
+    Подсказки для введенного текста с кэшем последних префиксов
+    """
+    text = normalize(text)
+    if len(text) < MIN_LENGTH:
+        return []
+    limit = min(limit or settings.PRODUCTS_AUTOCOMPLETE_LIMIT, settings.PRODUCTS_AUTOCOMPLETE_MAX_LIMIT)
+    period = int(time.monotonic() // settings.PRODUCTS_AUTOCOMPLETE_CACHE_TTL)
+    return [{'name': name, 'model': model}
+            for name, model in _cached_suggestions(text, shop_id, category_id, limit, period)]
+
+
+def clear_cache():
+    _cached_suggestions.cache_clear()
@@ -0,0 +1,226 @@
+"""
+Общий (Redis) кэш ответов каталога: категорий, магазинов и товаров.
+
+Ключ ответа составляется из адреса и нормализованных параметров запроса,
+а в записи хранятся версии областей, от которых ответ зависит (``shop:<id>``,
+``category:<id>``, ``products``, ``shops``, ``categories``). Инвалидация -
+увеличение версии области после фиксации транзакции импорта или изменения
+магазина: запись с другими версиями считается устаревшей. По тем же версиям
+без обращения к базе вычисляются ETag и Last-Modified (см. ``conditional``).
+
+Устаревший ответ пересчитывается одним процессом под короткой блокировкой
+(single-flight); остальные запросы в это время получают прежний ответ, пока
+он не старше окна CATALOG_CACHE_STALE_TTL, а при его отсутствии ждут.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from backend.models import Product
+
+
+def get_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def version_key(scope):
+    return f'catalog:version:{scope}'
+
+
+def initial_version():
+    # после вытеснения ключа версия не должна вернуться к уже использованному значению
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """
+    Текущие версии областей одним запросом к кэшу
+    """
+    cache = get_cache()
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # версии живут без срока: их истечение сбрасывало бы весь кэш каталога
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*scopes):
+    """
+    Увеличивает версии областей; новая версия не меньше текущего времени в миллисекундах,
+    поэтому служит и временем последнего изменения
+    """
+    cache = get_cache()
+    now = initial_version()
+    for scope in scopes:
+        key = version_key(scope)
+        current = cache.get(key)
+        try:
+            cache.incr(key, max(now - current, 1) if current else 1)
+        except ValueError:
+            cache.set(key, now, None)
+
+
+def invalidate(*scopes):
+    """
+    Инвалидирует области после фиксации текущей транзакции
+    """
+    transaction.on_commit(lambda: bump_versions(*scopes))
+
+
+def invalidate_shop(shop_id, category_ids=()):
+    """
+    Инвалидирует товары магазина: его область, области затронутых категорий и списки без фильтров
+    """
+    invalidate('products', f'shop:{shop_id}', *(f'category:{category_id}' for category_id in set(category_ids)))
+
+
+def invalidate_shop_visibility(shop_id):
+    """
+    Магазин включен или выключен: меняются список магазинов и товары во всех его категориях
+    """
+    category_ids = Product.objects.filter(shop_id=shop_id).values_list('category_id', flat=True).distinct()
+    invalidate('shops', 'products', f'shop:{shop_id}',
+               *(f'category:{category_id}' for category_id in category_ids))
+
+
+def validators(request, versions):
+    """
+    ETag и Last-Modified (в секундах) ответа, построенного при данных версиях областей
+    """
+    etag = quote_etag(hashlib.sha1(repr((request.get_full_path(), request.user.id, versions))
+                                     .encode()).hexdigest())
+    return etag, max(versions) // 1000
+
+
+def conditional(scopes):
+    """
+    Декоратор метода представления: ETag и Last-Modified по версиям областей scopes(request),
+    без обращения к базе; на совпадающий условный запрос отдается 304 без построения ответа.
+    Если ответ взят из кэша (в том числе устаревший), валидаторы считаются по версиям,
+    при которых он был построен (атрибут ответа catalog_versions)
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            versions = get_versions(scopes(request))
+            etag, last_modified = validators(request, versions)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                served = getattr(response, 'catalog_versions', versions)
+                if served != versions:
+                    etag, last_modified = validators(request, served)
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+def orders_scope(request):
+    """
+    Версия заказов и корзины пользователя
+    """
+    return [f'orders:{request.user.id}']
+
+
+def response_key(endpoint, request):
+    # адрес входит в ключ: ссылки пагинации в ответе абсолютные
+    query = sorted((key, sorted(request.query_params.getlist(key))) for key in request.query_params)
+    digest = hashlib.sha1(repr((request.build_absolute_uri(request.path), query)).encode()).hexdigest()
+    return f'catalog:response:{endpoint}:{digest}'
+
+
+def store_response(key, versions, data):
+    now = time.time()
+    entry = {'versions': versions, 'data': data, 'fresh_until': now + settings.CATALOG_CACHE_TTL}
+    get_cache().set(key, entry, settings.CATALOG_CACHE_TTL + settings.CATALOG_CACHE_STALE_TTL)
+
+
+def is_fresh(entry, versions):
+    return entry is not None and entry['versions'] == versions and time.time() < entry['fresh_until']
+
+
+def is_usable_stale(entry):
+    return entry is not None and time.time() < entry['fresh_until'] + settings.CATALOG_CACHE_STALE_TTL
+
+
+def wait_for_response(key, versions):
+    """
+    Ждет, пока ответ пересчитает держатель блокировки; None, если не дождались
+    """
+    deadline = time.monotonic() + settings.CATALOG_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = get_cache().get(key)
+        if is_fresh(entry, versions):
+            return entry
+    return None
+
+
+def cached_response(request, endpoint, scopes, build):
+    """
+    Ответ из кэша либо результат build(); кэшируются только ответы 200.
+    Устаревший ответ пересчитывает один процесс под короткой блокировкой, остальные
+    в это время получают прежний ответ (не старше CATALOG_CACHE_STALE_TTL) или ждут
+    """
+    cache = get_cache()
+    key = response_key(endpoint, request)
+    versions = get_versions(scopes)
+    entry = cache.get(key)
+    if is_fresh(entry, versions):
+        return entry_response(entry)
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        if is_usable_stale(entry):
+            return entry_response(entry)
+        entry = wait_for_response(key, versions)
+        if entry is not None:
+            return entry_response(entry)
+        # держатель блокировки не успел: ответ строится без записи в кэш
+        return build()
+
+    try:
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            store_response(key, versions, response.data)
+            response.catalog_versions = versions
+    finally:
+        cache.delete(lock_key)
+    return response
+
+
+def entry_response(entry):
+    """
+    Ответ из записи кэша; версии записи нужны conditional для ETag устаревшего ответа
+    """
+    response = Response(entry['data'])
+    response.catalog_versions = entry['versions']
+    return response
+
+
+def product_scopes(query_params):
+    """
+    Области, от которых зависит список товаров с данными параметрами запроса
+    """
+    scopes = []
+    if query_params.get('shop_id'):
+        scopes.append(f"shop:{query_params['shop_id']}")
+    if query_params.get('category_id'):
+        scopes.append(f"category:{query_params['category_id']}")
+    return scopes or ['products']
@@ -0,0 +1,192 @@
+"""
+Версии каталога магазина.
+
+Прайс сначала собирается в отдельную версию (``CatalogVersion`` и её строки
+``CatalogItem``, которые записывает движок импорта: пакетами ORM или через
+COPY), не затрагивая рабочие таблицы товаров, которые читает каталог. Затем
+версия публикуется: движок импорта переносит в ``Product``/``ProductParameter``
+только отличия и в конце той же транзакции, под блокировкой строки магазина,
+переключает опубликованную версию и контрольную сумму прайса. Предыдущая
+опубликованная версия остается в архиве, и к ней можно быстро откатиться той
+же публикацией; лишние архивные и брошенные несобранные версии удаляются
+после фиксации.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from backend.fetcher import fetch_price_list
+from backend.importer import PriceListImporter, ImportResult, price_list_checksum
+from backend.models import Shop, CatalogVersion
+from backend.price_parser import iter_price_list, iter_document, iter_batches
+from backend.validation import ensure_valid_price_list
+
+# первый ключ рекомендательной блокировки публикации, второй - id магазина
+PUBLISH_LOCK_NAMESPACE = 7001
+
+
+def build_catalog_version(source, batch_size=None, progress=None, importer_class=PriceListImporter):
+    """
+    Собирает версию каталога из прайса (словаря документа, файла или байтов YAML);
+    строки версии записывает движок importer_class. Возвращает пару (магазин, версия);
+    версия равна None, если прайс не изменился
+    """
+    batch_size = batch_size or settings.PRICE_IMPORT_BATCH_SIZE
+    importer = importer_class(batch_size=batch_size)
+    if isinstance(source, dict):
+        checksum, records = '', iter_document(source)
+    else:
+        checksum, records = price_list_checksum(source) or '', iter_price_list(source)
+
+    shop, version, categories, processed = None, None, [], 0
+    if progress:
+        progress(processed)
+    with transaction.atomic():
+        for key, value in iter_batches(records, batch_size):
+            if key == 'shop':
+                shop, _ = Shop.objects.get_or_create(name=value)
+                if checksum and shop.price_checksum == checksum:
+                    return shop, None
+                version = CatalogVersion.objects.create(shop=shop, checksum=checksum)
+            elif key == 'categories':
+                categories.extend(value)
+            elif key == 'goods':
+                if version is None:
+                    raise ValueError('В прайсе магазин должен быть указан до списка товаров')
+                importer.stage_items(version, value)
+                processed += len(value)
+                if progress:
+                    progress(processed)
+
+        if version is None:
+            raise ValueError('В прайсе не указан магазин')
+        version.categories = categories
+        version.save(update_fields=['categories'])
+    return shop, version
+
+
+def iter_version(version, batch_size):
+    """
+    Выдает записи версии каталога в формате iter_price_list
+    """
+    yield 'shop', version.shop.name
+    for category in version.categories:
+        yield 'categories', category
+    items = version.items.order_by('id').values_list('data', flat=True)
+    for item in items.iterator(chunk_size=batch_size):
+        yield 'goods', item
+
+
+@contextmanager
+def publish_lock(shop_id):
+    """
+    Не дает двум публикациям одного магазина идти одновременно; строки магазина не блокирует
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s, %s)', [PUBLISH_LOCK_NAMESPACE, shop_id])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s, %s)', [PUBLISH_LOCK_NAMESPACE, shop_id])
+
+
+def activate_catalog_version(version):
+    """
+    Делает версию опубликованной, а прежнюю - архивной; вызывается в конце транзакции импорта,
+    поэтому строка магазина блокируется только до её фиксации
+    """
+    shop = Shop.objects.select_for_update().get(id=version.shop_id)
+    shop.price_checksum = version.checksum
+    shop.save(update_fields=['price_checksum'])
+
+    shop.catalog_versions.filter(state='published').exclude(id=version.id).update(state='archived')
+    version.state = 'published'
+    version.published_at = timezone.now()
+    version.save(update_fields=['state', 'published_at'])
+
+
+def publish_catalog_version(version, importer_class=PriceListImporter, progress=None):
+    """
+    Публикует версию каталога: переносит отличия в рабочие таблицы и в той же транзакции
+    переводит прежнюю опубликованную версию в архив; лишние версии удаляются после фиксации
+    """
+    importer = importer_class(progress=progress)
+    if progress:
+        progress(0)
+    with publish_lock(version.shop_id):
+        # прайс отката совпадает с одним из ранее загруженных, поэтому проверка суммы не нужна
+        result = importer.run_records(iter_version(version, importer.batch_size),
+                                      before_commit=lambda: activate_catalog_version(version))
+
+    transaction.on_commit(lambda: prune_catalog_versions(version.shop_id))
+    return result
+
+
+def prune_catalog_versions(shop_id):
+    """
+    Удаляет архивные версии магазина сверх PRICE_IMPORT_KEEP_VERSIONS и собранные, но так и
+    не опубликованные версии старше PRICE_IMPORT_ABANDONED_AFTER секунд
+    """
+    keep = max(settings.PRICE_IMPORT_KEEP_VERSIONS - 1, 0)
+    versions = CatalogVersion.objects.filter(shop_id=shop_id)
+    stale = list(versions.filter(state='archived').order_by('-published_at').values_list('id', flat=True)[keep:])
+    abandoned_before = timezone.now() - timedelta(seconds=settings.PRICE_IMPORT_ABANDONED_AFTER)
+    stale.extend(versions.filter(state='building', created_at__lt=abandoned_before).values_list('id', flat=True))
+    CatalogVersion.objects.filter(id__in=stale).delete()
+    return len(stale)
+
+
+def skipped_result(shop):
+    """
+    Результат импорта, когда прайс магазина не изменился
+    """
+    result = ImportResult()
+    result.skipped = True
+    result.unchanged = shop.shop_product.filter(is_active=True).count()
+    return result
+
+
+def import_price_list(source, importer_class=PriceListImporter, progress=None, publish_progress=None, shop=None):
+    """
+    Проверяет прайс, собирает из него версию каталога и публикует её;
+    прайс с ошибками или (если указан shop) прайс другого магазина отклоняется до любой записи в базу
+    """
+    ensure_valid_price_list(source, shop=shop)
+    shop, version = build_catalog_version(source, progress=progress, importer_class=importer_class)
+    if version is None:
+        return skipped_result(shop)
+    return publish_catalog_version(version, importer_class=importer_class, progress=publish_progress)
+
+
+def import_price_source(source, progress=None, publish_progress=None):
+    """
+    Загружает прайс по адресу источника условным запросом и импортирует его;
+    если прайс не изменился (ответ 304), импорт не выполняется
+    """
+    stream, etag, last_modified = fetch_price_list(source.url, source.etag, source.last_modified)
+    if stream is None:
+        result = skipped_result(source.shop)
+    else:
+        with stream:
+            # источник привязан к магазину, поэтому прайс другого магазина не загружается
+            result = import_price_list(stream, progress=progress, publish_progress=publish_progress,
+                                       shop=source.shop)
+
+    # валидаторы сохраняются только после успешного импорта, иначе следующий запрос получит 304
+    source.etag, source.last_modified, source.fetched_at = etag, last_modified, timezone.now()
+    source.save(update_fields=['etag', 'last_modified', 'fetched_at'])
+    return result
+
+
+def rollback_catalog(shop):
+    """
+    Возвращает каталог магазина к предыдущей опубликованной версии
+    """
+    previous = shop.catalog_versions.filter(state='archived').order_by('-published_at').first()
+    if previous is None:
+        raise ValueError(f'Для магазина {shop.name} нет предыдущей версии каталога')
+    return publish_catalog_version(previous)
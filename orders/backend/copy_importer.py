@@ -0,0 +1,178 @@
+"""
+Режим сверхбыстрой первичной загрузки каталога (только PostgreSQL).
+
+Товары и значения параметров потоково передаются через ``COPY FROM STDIN``
+во временные таблицы, после чего переносятся в рабочие таблицы одним
+SQL-запросом на каждую таблицу. Строки собираемой версии каталога
+(``CatalogItem``) тоже записываются через COPY.
+"""
+import json
+from io import StringIO
+
+from django.db import connection
+
+from backend.importer import PriceListImporter, good_row
+from backend.models import Product, ProductParameter, CatalogItem
+
+PRODUCT_STAGING = 'import_product_staging'
+PARAMETER_STAGING = 'import_parameter_staging'
+# id товаров, у которых изменился отпечаток, и номер строки прайса, из которой они загружены
+CHANGED_PRODUCTS = 'import_changed_products'
+
+# таблицы живут до конца внешней транзакции: второй импорт в ней же очищает их, а не создает заново
+STAGING_TABLES_SQL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {PRODUCT_STAGING} (
+        seq integer PRIMARY KEY,
+        external_id bigint NOT NULL,
+        name text NOT NULL,
+        model text NOT NULL,
+        category_id bigint NOT NULL,
+        price integer NOT NULL,
+        price_rrc integer NOT NULL,
+        quantity integer NOT NULL,
+        fingerprint text NOT NULL,
+        attributes jsonb NOT NULL
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE IF NOT EXISTS {PARAMETER_STAGING} (
+        seq integer NOT NULL,
+        parameter_id bigint NOT NULL,
+        value text NOT NULL
+    ) ON COMMIT DROP;
+    CREATE TEMP TABLE IF NOT EXISTS {CHANGED_PRODUCTS} (
+        product_id bigint NOT NULL,
+        seq integer NOT NULL
+    ) ON COMMIT DROP;
+    TRUNCATE {PRODUCT_STAGING}, {PARAMETER_STAGING}, {CHANGED_PRODUCTS};
+"""
+
+# при повторе external_id в прайсе побеждает последняя строка, как и в PriceListImporter
+MERGE_PRODUCTS_SQL = f"""
+    WITH staged AS (
+        SELECT DISTINCT ON (external_id) *
+        FROM {PRODUCT_STAGING}
+        ORDER BY external_id, seq DESC
+    ), matched AS (
+        SELECT s.*, p.id AS product_id, p.fingerprint AS old_fingerprint, p.is_active AS old_is_active
+        FROM staged s
+        LEFT JOIN {{product}} p ON p.shop_id = %(shop_id)s AND p.external_id = s.external_id
+    ), updated AS (
+        UPDATE {{product}} p
+        SET name = m.name, model = m.model, category_id = m.category_id, price = m.price,
+            price_rrc = m.price_rrc, quantity = m.quantity, fingerprint = m.fingerprint,
+            attributes = m.attributes, is_active = TRUE
+        FROM matched m
+        WHERE p.id = m.product_id AND (p.fingerprint <> m.fingerprint OR NOT p.is_active)
+        RETURNING p.id
+    ), inserted AS (
+        INSERT INTO {{product}} (name, model, external_id, price, price_rrc, quantity, category_id, shop_id,
+                                 is_active, fingerprint, attributes)
+        SELECT name, model, external_id, price, price_rrc, quantity, category_id, %(shop_id)s, TRUE, fingerprint,
+               attributes
+        FROM matched
+        WHERE product_id IS NULL
+        RETURNING id, external_id
+    ), changed AS (
+        INSERT INTO {CHANGED_PRODUCTS} (product_id, seq)
+        SELECT product_id, seq FROM matched
+        WHERE product_id IS NOT NULL AND old_fingerprint <> fingerprint
+        UNION ALL
+        SELECT i.id, m.seq FROM inserted i JOIN matched m ON m.external_id = i.external_id
+    )
+    SELECT (SELECT count(*) FROM staged), (SELECT count(*) FROM updated), (SELECT count(*) FROM inserted)
+"""
+
+MERGE_PARAMETERS_SQL = f"""
+    WITH deleted AS (
+        DELETE FROM {{product_parameter}} pp
+        USING {CHANGED_PRODUCTS} c
+        WHERE pp.product_id = c.product_id
+    )
+    INSERT INTO {{product_parameter}} (product_id, parameter_id, value)
+    SELECT c.product_id, ps.parameter_id, ps.value
+    FROM {PARAMETER_STAGING} ps
+    JOIN {CHANGED_PRODUCTS} c ON c.seq = ps.seq
+"""
+
+
+def copy_value(value):
+    """
+    Экранирует значение для текстового формата COPY
+    """
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def require_postgresql():
+    if connection.vendor != 'postgresql':
+        raise ValueError('Загрузка через COPY доступна только для PostgreSQL')
+
+
+def copy_rows(cursor, table, columns, rows):
+    buffer = StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+class CopyPriceListImporter(PriceListImporter):
+    """
+    Импорт через COPY во временные таблицы с последующим слиянием.
+    В отличие от PriceListImporter параметры изменившихся товаров
+    пересоздаются целиком: режим предназначен для первичной загрузки.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._seq = 0
+
+    def begin(self):
+        require_postgresql()
+        with connection.cursor() as cursor:
+            cursor.execute(STAGING_TABLES_SQL)
+
+    def stage_items(self, version, items):
+        require_postgresql()
+        with connection.cursor() as cursor:
+            copy_rows(cursor, CatalogItem._meta.db_table, ('version_id', 'data'),
+                      ((version.id, json.dumps(item, ensure_ascii=False)) for item in items))
+
+    def import_goods(self, goods):
+        parameter_ids = self.resolve_parameters(
+            {name for item in goods for name in item['parameters']})
+
+        products, parameters = [], []
+        for item in goods:
+            self._seq += 1
+            values, item_parameters, fingerprint = good_row(item)
+            products.append((self._seq, item['id'], values['name'], values['model'], values['category_id'],
+                             values['price'], values['price_rrc'], values['quantity'], fingerprint,
+                             json.dumps(values['attributes'], ensure_ascii=False)))
+            parameters.extend((self._seq, parameter_ids[name], value) for name, value in item_parameters)
+            self._seen.add(item['id'])
+
+        with connection.cursor() as cursor:
+            copy_rows(cursor, PRODUCT_STAGING, ('seq', 'external_id', 'name', 'model', 'category_id', 'price',
+                                                'price_rrc', 'quantity', 'fingerprint', 'attributes'), products)
+            copy_rows(cursor, PARAMETER_STAGING, ('seq', 'parameter_id', 'value'), parameters)
+
+        self.processed += len(goods)
+        if self.progress:
+            self.progress(self.processed)
+
+    def finish(self):
+        tables = {'product': Product._meta.db_table, 'product_parameter': ProductParameter._meta.db_table}
+        # отличия вычисляются в SQL, поэтому для инвалидации кэша берутся все категории магазина и прайса
+        self.touched_categories.update(
+            Product.objects.filter(shop=self.shop).values_list('category_id', flat=True).distinct())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT DISTINCT category_id FROM {PRODUCT_STAGING}')
+            self.touched_categories.update(category_id for category_id, in cursor.fetchall())
+            cursor.execute(MERGE_PRODUCTS_SQL.format(**tables), {'shop_id': self.shop.id})
+            staged, updated, created = cursor.fetchone()
+            cursor.execute(MERGE_PARAMETERS_SQL.format(**tables))
+
+        self.result.created += created
+        self.result.updated += updated
+        self.result.unchanged += staged - created - updated
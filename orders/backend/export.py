@@ -0,0 +1,102 @@
+"""
+Потоковая выгрузка каталога магазина в NDJSON или CSV.
+
+Товары читаются серверным курсором порциями ``PRODUCTS_EXPORT_CHUNK_SIZE``
+и сразу превращаются в строки файла; при сжатии строки пропускаются через
+потоковый gzip. Расход памяти не зависит от размера каталога.
+"""
+import csv
+import json
+import zlib
+from io import StringIO
+
+from django.conf import settings
+
+from backend.models import Product
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+# столбцы выгрузки: имя в файле -> столбец values()
+EXPORT_COLUMNS = {
+    'id': 'external_id',
+    'name': 'name',
+    'model': 'model',
+    'category_id': 'category_id',
+    'category': 'category__name',
+    'price': 'price',
+    'price_rrc': 'price_rrc',
+    'quantity': 'quantity',
+    'parameters': 'attributes',
+}
+# сколько байт несжатого вывода накапливать перед отправкой
+FLUSH_SIZE = 64 * 1024
+
+
+def export_rows(shop_id):
+    """
+    Товары магазина в наличии в прайсе, по порядку, порциями через серверный курсор
+    """
+    rows = (Product.objects.filter(shop_id=shop_id, is_active=True)
+            .order_by('id')
+            .values_list(*EXPORT_COLUMNS.values()))
+    return rows.iterator(chunk_size=settings.PRODUCTS_EXPORT_CHUNK_SIZE)
+
+
+def iter_ndjson(rows):
+    names = tuple(EXPORT_COLUMNS)
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def iter_csv(rows):
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        # параметры - JSON-объект в одной ячейке
+        writer.writerow(row[:-1] + (json.dumps(row[-1], ensure_ascii=False),))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_chunks(lines):
+    """
+    Склеивает строки в блоки около FLUSH_SIZE байт
+    """
+    chunk, size = [], 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        size += len(data)
+        if size >= FLUSH_SIZE:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def iter_gzip(chunks):
+    """
+    Сжимает поток блоков в формат gzip по мере поступления
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_catalog(shop_id, export_format='ndjson', compress=False):
+    """
+    Итератор блоков байт выгрузки каталога магазина
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Формат выгрузки: {', '.join(EXPORT_FORMATS)}")
+    lines = (iter_ndjson if export_format == 'ndjson' else iter_csv)(export_rows(shop_id))
+    chunks = iter_chunks(lines)
+    return iter_gzip(chunks) if compress else chunks
@@ -0,0 +1,105 @@
+"""
+Фильтры каталога по параметрам, цене и наличию и счетчики фасетов.
+
+Фильтр по параметру - условие ``attributes @> {"имя": "значение"}``,
+которое обслуживает GIN-индекс по ``Product.attributes``. Счетчики для
+выборки без фильтров по параметрам, цене и наличию берутся из таблицы
+``ProductFacet``, которую пересчитывает импорт прайса; для остальных
+выборок значения параметров считаются по отфильтрованным товарам.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Q, Sum
+
+from backend.models import Product, ProductFacet
+
+PARAM_RE = re.compile(r'^param\[(.+)\]$')
+
+REBUILD_FACETS_SQL = """
+    WITH deleted AS (
+        DELETE FROM {facet} WHERE shop_id = %(shop_id)s
+    )
+    INSERT INTO {facet} (shop_id, category_id, parameter, value, count)
+    SELECT p.shop_id, p.category_id, a.key, a.value, count(*)
+    FROM {product} p, jsonb_each_text(p.attributes) a
+    WHERE p.shop_id = %(shop_id)s AND p.is_active
+    GROUP BY p.shop_id, p.category_id, a.key, a.value
+"""
+
+COUNT_FACETS_SQL = """
+    SELECT a.key, a.value, count(*)
+    FROM ({products}) p, jsonb_each_text(p.attributes) a
+    GROUP BY a.key, a.value
+"""
+
+
+def rebuild_facets(shop):
+    """
+    Пересчитывает счетчики фасетов магазина одним запросом по его товарам
+    """
+    tables = {'facet': ProductFacet._meta.db_table, 'product': Product._meta.db_table}
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_FACETS_SQL.format(**tables), {'shop_id': shop.id})
+
+
+def parse_int(query_params, name):
+    value = query_params.get(name)
+    if value in (None, ''):
+        return None
+    if not value.isdigit():
+        raise ValueError(f'{name}: ожидается целое неотрицательное число')
+    return int(value)
+
+
+def product_filters(query_params):
+    """
+    Условие по параметрам запроса param[<имя>]=<значение> (несколько значений - любое из них),
+    price_min, price_max и in_stock; второе значение - есть ли такие фильтры в запросе
+    """
+    query = Q()
+    for key in query_params:
+        match = PARAM_RE.match(key)
+        if not match:
+            continue
+        values = Q()
+        for value in query_params.getlist(key):
+            values |= Q(attributes__contains={match.group(1): value})
+        query &= values
+
+    price_min, price_max = parse_int(query_params, 'price_min'), parse_int(query_params, 'price_max')
+    if price_min is not None:
+        query &= Q(price__gte=price_min)
+    if price_max is not None:
+        query &= Q(price__lte=price_max)
+    if query_params.get('in_stock') in ('1', 'true'):
+        query &= Q(quantity__gt=0)
+    return query, bool(query)
+
+
+def group_facets(rows):
+    facets = defaultdict(dict)
+    for parameter, value, count in rows:
+        facets[parameter][value] = count
+    return {parameter: dict(sorted(values.items())) for parameter, values in sorted(facets.items())}
+
+
+def product_facets(queryset, shop_id=None, category_id=None, filtered=True):
+    """
+    Счетчики {параметр: {значение: число товаров}} по выборке товаров;
+    без фильтров (filtered=False) берутся из ProductFacet
+    """
+    if not filtered:
+        facets = ProductFacet.objects.filter(shop__state=True)
+        if shop_id:
+            facets = facets.filter(shop_id=shop_id)
+        if category_id:
+            facets = facets.filter(category_id=category_id)
+        return group_facets(facets.values('parameter', 'value').annotate(total=Sum('count'))
+                            .values_list('parameter', 'value', 'total'))
+
+    sql, params = queryset.order_by().values('attributes').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(COUNT_FACETS_SQL.format(products=sql), params)
+        return group_facets(cursor.fetchall())
@@ -0,0 +1,121 @@
+"""
+Быстрое чтение списков без ModelSerializer.
+
+Строки берутся через ``.values()`` и превращаются в словари заранее
+собранными функциями: для каждого поля известны столбец и, если нужно,
+преобразование значения. Результат совпадает с выводом соответствующего
+сериализатора DRF (включая ?fields= и ?expand=), что проверяется тестами.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from backend.models import OrderPosition
+from backend.serializers import (CategorySerializer, ShopSerializer, ProductSerializer, OrderSerializer,
+                                 requested_fields)
+
+
+def product_parameters(attributes):
+    return [{'parameter': name, 'value': value} for name, value in sorted(attributes.items())]
+
+
+def compile_converter(columns):
+    """
+    Функция строка values() -> словарь; columns - список (поле, столбец, преобразование или None)
+    """
+    pairs = tuple((field, column) for field, column, _ in columns)
+    transforms = tuple((field, transform) for field, _, transform in columns if transform is not None)
+
+    if not transforms:
+        def convert(row):
+            return {field: row[column] for field, column in pairs}
+    else:
+        def convert(row):
+            item = {field: row[column] for field, column in pairs}
+            for field, transform in transforms:
+                item[field] = transform(item[field])
+            return item
+    return convert
+
+
+class RowSerializer:
+    """
+    Сериализатор строк .values() в формате serializer_class; только для чтения
+    """
+    serializer_class = None
+    # поле сериализатора -> (столбец values(), преобразование или None)
+    columns = {}
+    # столбцы, которые выбираются всегда (например, для курсора пагинации)
+    extra_columns = ()
+
+    def __init__(self, request=None):
+        self.fields = requested_fields(request, self.serializer_class)
+        self.convert = compile_converter([(field, *self.columns[field]) for field in self.fields
+                                          if field in self.columns])
+
+    def values(self, queryset):
+        columns = {self.columns[field][0] for field in self.fields if field in self.columns}
+        return queryset.values(*columns.union(self.extra_columns))
+
+    def to_representation(self, rows):
+        convert = self.convert
+        return [convert(row) for row in rows]
+
+    def data(self, queryset):
+        return self.to_representation(self.values(queryset))
+
+
+class CategoryRowSerializer(RowSerializer):
+    serializer_class = CategorySerializer
+    columns = {'id': ('id', None), 'name': ('name', None)}
+
+
+class ShopRowSerializer(RowSerializer):
+    serializer_class = ShopSerializer
+    columns = {'id': ('id', None), 'name': ('name', None)}
+
+
+class ProductRowSerializer(RowSerializer):
+    serializer_class = ProductSerializer
+    columns = {
+        'name': ('name', None),
+        'model': ('model', None),
+        'price': ('price', None),
+        'price_rrc': ('price_rrc', None),
+        'quantity': ('quantity', None),
+        'category': ('category__name', None),
+        'shop': ('shop_id', None),
+        'parameters': ('attributes', product_parameters),
+    }
+    extra_columns = ('id',)
+
+
+class OrderRowSerializer(RowSerializer):
+    serializer_class = OrderSerializer
+    columns = {
+        'id': ('id', None),
+        'status': ('status', None),
+        'order_datetime': ('order_datetime', serializers.DateTimeField().to_representation),
+        'address': ('address', None),
+    }
+    extra_columns = ('id',)
+    position_converter = compile_converter([('id', 'id', None), ('product', 'product__name', None),
+                                            ('product_id', 'product_id', None), ('amount', 'amount', None)])
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        positions = defaultdict(list)
+        if 'positions' in self.fields:
+            for position in (OrderPosition.objects
+                             .filter(order_id__in=[row['id'] for row in rows])
+                             .order_by('id')
+                             .values('id', 'order_id', 'product__name', 'product_id', 'amount')):
+                positions[position['order_id']].append(self.position_converter(position))
+
+        data = []
+        for row in rows:
+            item = self.convert(row)
+            if 'positions' in self.fields:
+                item['positions'] = positions[row['id']]
+            data.append({field: item[field] for field in self.fields})
+        return data
@@ -0,0 +1,68 @@
+"""
+Загрузка прайс-листов поставщиков по HTTP.
+
+Используется общая сессия с пулом соединений и таймаутами; запросы
+условные (If-None-Match / If-Modified-Since), а тело ответа пишется во
+временный файл на диске, а не в память.
+"""
+from tempfile import TemporaryFile
+
+from django.conf import settings
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_session = None
+
+
+class PriceListTooLarge(ValueError):
+    """
+    Размер прайс-листа превышает PRICE_IMPORT_MAX_DOWNLOAD_SIZE
+    """
+
+
+def get_session():
+    """
+    Общая для процесса HTTP-сессия: соединения с серверами поставщиков переиспользуются
+    """
+    global _session
+    if _session is None:
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504), allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=retries)
+        _session = Session()
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+    return _session
+
+
+def fetch_price_list(url, etag='', last_modified='', max_size=None):
+    """
+    Скачивает прайс во временный файл. Возвращает (файл, etag, last_modified);
+    если прайс не изменился с прошлой загрузки (ответ 304), файл равен None
+    """
+    max_size = max_size or settings.PRICE_IMPORT_MAX_DOWNLOAD_SIZE
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+
+    with get_session().get(url, headers=headers, stream=True, timeout=settings.PRICE_IMPORT_TIMEOUT) as response:
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+
+        if int(response.headers.get('Content-Length') or 0) > max_size:
+            raise PriceListTooLarge(f'Размер прайса превышает {max_size} байт')
+
+        stream = TemporaryFile()
+        size = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if size > max_size:
+                stream.close()
+                raise PriceListTooLarge(f'Размер прайса превышает {max_size} байт')
+            stream.write(chunk)
+        stream.seek(0)
+
+        return stream, response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
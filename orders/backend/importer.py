@@ -0,0 +1,317 @@
+"""
+Импорт прайс-листов поставщиков.
+
+Общий движок для ``ProviderPriceUpdate`` и команды ``import_yaml``:
+прайс-лист читается потоково (см. ``backend.price_parser``) и загружается
+пакетными запросами в одной транзакции вместо get_or_create на каждую
+категорию, товар и параметр.
+
+Повторная загрузка инкрементальна: файл с неизменной контрольной суммой
+пропускается целиком, товары с неизменным отпечатком не трогаются, у
+изменившихся обновляются только отличающиеся поля и параметры, а товары,
+пропавшие из прайса, снимаются с продажи (is_active=False). После загрузки
+пересчитываются счетчики фасетов магазина (см. ``backend.facets``).
+"""
+import hashlib
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import Signal
+
+from backend.cache import invalidate, invalidate_shop
+from backend.facets import rebuild_facets
+from backend.models import Shop, Category, Product, Parameter, ProductParameter, CatalogItem
+from backend.price_parser import iter_price_list, iter_document, iter_batches
+
+# импорт изменил товары магазина; аргумент shop_id
+catalog_imported = Signal()
+
+# поля товара, которые приходят из прайса и могут измениться между загрузками
+PRODUCT_FIELDS = ('name', 'model', 'category_id', 'price', 'price_rrc', 'quantity')
+
+
+def price_list_checksum(source):
+    """
+    Контрольная сумма файла или байтов прайса; позиция файла возвращается в начало
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, str)):
+        digest.update(source.encode() if isinstance(source, str) else source)
+        return digest.hexdigest()
+    if not hasattr(source, 'seek'):
+        return None
+
+    while True:
+        block = source.read(1024 * 1024)
+        if not block:
+            break
+        digest.update(block.encode() if isinstance(block, str) else block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def product_fingerprint(values, parameters):
+    """
+    Отпечаток строки прайса: совпадает, только если совпадают все поля и параметры товара
+    """
+    row = [values[field] for field in PRODUCT_FIELDS] + [list(parameter) for parameter in parameters]
+    return hashlib.sha1(json.dumps(row, ensure_ascii=False).encode()).hexdigest()
+
+
+def good_row(item):
+    """
+    Поля товара (вместе с attributes), отсортированные пары (параметр, значение) и отпечаток строки прайса
+    """
+    values = {
+        'name': item['name'],
+        'model': item['model'],
+        'category_id': item['category'],
+        'price': item['price'],
+        'price_rrc': item['price_rrc'],
+        'quantity': item['quantity'],
+    }
+    parameters = sorted((name, str(value)) for name, value in item['parameters'].items())
+    fingerprint = product_fingerprint(values, parameters)
+    values['attributes'] = dict(parameters)
+    return values, parameters, fingerprint
+
+
+class ImportResult:
+    """
+    Счетчики строк, обработанных при импорте
+    """
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        # прайс не изменился с прошлой загрузки, запись не выполнялась
+        self.skipped = False
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'unchanged': self.unchanged,
+                'removed': self.removed, 'skipped': self.skipped}
+
+
+class PriceListImporter:
+    """
+    Загружает прайс-лист магазина пакетными запросами:
+    - категории и параметры разрешаются одним запросом на пакет;
+    - товары вставляются и обновляются через bulk_create/bulk_update по ключу (shop, external_id);
+    - изменения определяются по отпечатку строки, у изменившихся товаров
+      обновляются только отличающиеся поля и значения параметров.
+    """
+
+    def __init__(self, batch_size=None, progress=None):
+        self.batch_size = batch_size or getattr(settings, 'PRICE_IMPORT_BATCH_SIZE', 1000)
+        # progress(processed) вызывается после каждого пакета товаров
+        self.progress = progress
+        self.processed = 0
+        self.result = ImportResult()
+        self.shop = None
+        self._parameter_ids = {}
+        self._seen = set()
+        # категории, в которых изменились товары, и изменился ли список категорий - для инвалидации кэша
+        self.touched_categories = set()
+        self.categories_changed = False
+        # магазины, чей каталог изменился: этот и, при переименовании категорий, все, кто в них продает
+        self.changed_shops = set()
+
+    def run(self, source):
+        """
+        Импортирует прайс: уже загруженный документ (словарь с ключами shop, categories, goods)
+        либо файл или байты YAML, которые разбираются потоково
+        """
+        if isinstance(source, dict):
+            return self.run_records(iter_document(source))
+        return self.run_records(iter_price_list(source), price_list_checksum(source))
+
+    def run_records(self, records, checksum=None, before_commit=None):
+        """
+        Импортирует записи прайса в формате iter_price_list; при совпадении checksum
+        с контрольной суммой последнего загруженного прайса магазина запись не выполняется.
+        before_commit() вызывается последним в транзакции импорта (см. backend.catalog)
+        """
+        with transaction.atomic():
+            self.begin()
+            for key, value in iter_batches(records, self.batch_size):
+                if key == 'shop':
+                    self.shop, _ = Shop.objects.get_or_create(name=value)
+                    if checksum and self.shop.price_checksum == checksum:
+                        self.result.skipped = True
+                        self.result.unchanged = self.shop.shop_product.filter(is_active=True).count()
+                        return self.result
+                elif key == 'categories':
+                    self.import_categories(value)
+                elif key == 'goods':
+                    if self.shop is None:
+                        raise ValueError('В прайсе магазин должен быть указан до списка товаров')
+                    self.import_goods(value)
+
+            if self.shop is not None:
+                self.finish()
+                self.remove_missing()
+                rebuild_facets(self.shop)
+                if self.result.created or self.result.updated or self.result.removed:
+                    invalidate_shop(self.shop.id, self.touched_categories)
+                    self.changed_shops.add(self.shop.id)
+                if checksum:
+                    self.shop.price_checksum = checksum
+                    self.shop.save(update_fields=['price_checksum'])
+            if self.categories_changed:
+                invalidate('categories')
+            for shop_id in self.changed_shops:
+                catalog_imported.send(sender=self.__class__, shop_id=shop_id)
+            if before_commit:
+                before_commit()
+        return self.result
+
+    def begin(self):
+        """
+        Вызывается в начале транзакции импорта
+        """
+
+    def finish(self):
+        """
+        Вызывается после загрузки всех товаров, до снятия с продажи отсутствующих
+        """
+
+    def stage_items(self, version, items):
+        """
+        Записывает строки прайса в собираемую версию каталога
+        """
+        CatalogItem.objects.bulk_create([CatalogItem(version=version, data=item) for item in items],
+                                        batch_size=self.batch_size)
+
+    def import_categories(self, categories):
+        names = {category['id']: category['name'] for category in categories}
+        existing = dict(Category.objects.filter(id__in=names).values_list('id', 'name'))
+
+        created = [Category(id=category_id, name=name) for category_id, name in names.items()
+                   if category_id not in existing]
+        renamed = [Category(id=category_id, name=name) for category_id, name in names.items()
+                   if category_id in existing and existing[category_id] != name]
+        Category.objects.bulk_create(created, batch_size=self.batch_size)
+        Category.objects.bulk_update(renamed, ['name'], batch_size=self.batch_size)
+
+        if created or renamed:
+            self.categories_changed = True
+        if renamed:
+            # название категории выводится в товарах всех магазинов, которые в ней продают
+            category_ids = [category.id for category in renamed]
+            shop_ids = set(Product.objects.filter(category_id__in=category_ids)
+                           .values_list('shop_id', flat=True).distinct())
+            self.changed_shops.update(shop_ids)
+            invalidate('products', *(f'category:{category_id}' for category_id in category_ids),
+                       *(f'shop:{shop_id}' for shop_id in shop_ids))
+
+    def resolve_parameters(self, names):
+        """
+        Возвращает словарь {имя параметра: id}, создавая недостающие параметры
+        """
+        missing = set(names) - self._parameter_ids.keys()
+        if missing:
+            for parameter_id, name in Parameter.objects.filter(name__in=missing).values_list('id', 'name'):
+                self._parameter_ids.setdefault(name, parameter_id)
+            created = Parameter.objects.bulk_create(
+                [Parameter(name=name) for name in missing if name not in self._parameter_ids],
+                batch_size=self.batch_size)
+            for parameter in created:
+                self._parameter_ids[parameter.name] = parameter.id
+        return self._parameter_ids
+
+    def import_goods(self, goods):
+        # при повторе external_id в прайсе побеждает последняя строка
+        items = {item['id']: item for item in goods}
+        self._seen.update(items)
+
+        existing = {product.external_id: product
+                    for product in Product.objects.filter(shop=self.shop, external_id__in=items)}
+        parameter_ids = self.resolve_parameters(
+            {name for item in items.values() for name in item['parameters']})
+
+        to_create, changed_parameters = [], []
+        # товары группируются по набору изменившихся полей, чтобы обновлять только их
+        to_update = defaultdict(list)
+        for external_id, item in items.items():
+            values, parameters, fingerprint = good_row(item)
+
+            product = existing.get(external_id)
+            if product is None:
+                product = Product(shop=self.shop, external_id=external_id, fingerprint=fingerprint, **values)
+                to_create.append(product)
+                self.touched_categories.add(product.category_id)
+                changed_parameters.append((product, parameters))
+                self.result.created += 1
+                continue
+
+            if product.fingerprint == fingerprint and product.is_active:
+                self.result.unchanged += 1
+                continue
+
+            self.touched_categories.update((product.category_id, values['category_id']))
+            changed_fields = [field for field, value in values.items() if getattr(product, field) != value]
+            for field in changed_fields:
+                setattr(product, field, values[field])
+            if not product.is_active:
+                product.is_active = True
+                changed_fields.append('is_active')
+            if product.fingerprint != fingerprint:
+                product.fingerprint = fingerprint
+                changed_fields.append('fingerprint')
+                changed_parameters.append((product, parameters))
+            to_update[tuple(changed_fields)].append(product)
+            self.result.updated += 1
+
+        Product.objects.bulk_create(to_create, batch_size=self.batch_size)
+        for fields, products in to_update.items():
+            Product.objects.bulk_update(products, fields, batch_size=self.batch_size)
+        self.update_parameters(changed_parameters, parameter_ids)
+
+        self.processed += len(goods)
+        if self.progress:
+            self.progress(self.processed)
+
+    def update_parameters(self, changed_parameters, parameter_ids):
+        """
+        Приводит значения параметров товаров к прайсу, удаляя и добавляя только отличающиеся строки;
+        changed_parameters - список пар (товар, отсортированные пары (имя, значение))
+        """
+        current = defaultdict(lambda: defaultdict(list))
+        for row_id, product_id, parameter_id, value in (
+                ProductParameter.objects
+                .filter(product_id__in=[product.id for product, _ in changed_parameters])
+                .values_list('id', 'product_id', 'parameter_id', 'value')):
+            current[product_id][parameter_id].append((row_id, value))
+
+        to_delete, to_create = [], []
+        for product, parameters in changed_parameters:
+            rows = current.get(product.id, {})
+            wanted = {parameter_ids[name]: value for name, value in parameters}
+            for parameter_id, value in wanted.items():
+                existing_rows = rows.get(parameter_id, [])
+                if len(existing_rows) == 1 and existing_rows[0][1] == value:
+                    continue
+                to_delete.extend(row_id for row_id, _ in existing_rows)
+                to_create.append(ProductParameter(product_id=product.id, parameter_id=parameter_id, value=value))
+            for parameter_id, existing_rows in rows.items():
+                if parameter_id not in wanted:
+                    to_delete.extend(row_id for row_id, _ in existing_rows)
+
+        if to_delete:
+            ProductParameter.objects.filter(id__in=to_delete).delete()
+        ProductParameter.objects.bulk_create(to_create, batch_size=self.batch_size)
+
+    def remove_missing(self):
+        """
+        Снимает с продажи товары магазина, которых нет в загруженном прайсе
+        """
+        active = set(Product.objects.filter(shop=self.shop, is_active=True).values_list('external_id', flat=True))
+        missing = list(active - self._seen)
+        for start in range(0, len(missing), self.batch_size):
+            products = Product.objects.filter(shop=self.shop, external_id__in=missing[start:start + self.batch_size])
+            self.touched_categories.update(products.values_list('category_id', flat=True).distinct())
+            self.result.removed += products.update(is_active=False)
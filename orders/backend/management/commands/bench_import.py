@@ -0,0 +1,63 @@
+import random
+import time
+from tempfile import TemporaryFile
+
+import yaml
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from backend.catalog import import_price_list
+from backend.copy_importer import CopyPriceListImporter
+from backend.importer import PriceListImporter
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+
+def generate_price_list(stream, shop, goods, seed=0):
+    """
+    Пишет в поток синтетический прайс из goods товаров
+    """
+    rnd = random.Random(seed)
+    categories = [{'id': 900000 + number, 'name': f'Категория {number}'} for number in range(20)]
+    yaml.dump({'shop': shop, 'categories': categories}, stream, Dumper=SafeDumper,
+              allow_unicode=True, encoding='utf-8', sort_keys=False)
+    stream.write(b'goods:\n')
+    for number in range(goods):
+        item = {
+            'id': number + 1,
+            'category': rnd.choice(categories)['id'],
+            'model': f'model/{number % 1000}',
+            'name': f'Товар {number}',
+            'price': rnd.randint(100, 100000),
+            'price_rrc': rnd.randint(100, 100000),
+            'quantity': rnd.randint(0, 50),
+            'parameters': {'Цвет': rnd.choice(['черный', 'белый', 'красный']),
+                           'Вес (г)': rnd.randint(10, 5000)},
+        }
+        stream.write(yaml.dump([item], Dumper=SafeDumper, allow_unicode=True, encoding='utf-8', sort_keys=False))
+    stream.seek(0)
+
+
+class Command(BaseCommand):
+    help = ('Сравнение скорости импорта через ORM и через COPY на синтетическом прайсе: проверка, сборка '
+            'версии каталога и публикация, как в import_yaml (данные откатываются)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--goods', type=int, default=50000, help='число товаров в прайсе')
+
+    def handle(self, *args, **options):
+        for label, importer_class in (('orm', PriceListImporter), ('copy', CopyPriceListImporter)):
+            with TemporaryFile() as stream:
+                generate_price_list(stream, f'bench-{label}', options['goods'])
+
+                with transaction.atomic():
+                    started = time.monotonic()
+                    result = import_price_list(stream, importer_class=importer_class)
+                    elapsed = time.monotonic() - started
+                    transaction.set_rollback(True)
+
+            self.stdout.write(f"{label}: {options['goods']} goods, created: {result.created}, "
+                              f"{elapsed:.2f} s, {options['goods'] / elapsed:.0f} rows/s")
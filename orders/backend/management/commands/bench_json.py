@@ -0,0 +1,71 @@
+import random
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from backend.renderers import UJSONRenderer
+
+
+def products_payload(count, seed=0):
+    """
+    Ответ списка товаров в формате ProductSerializer
+    """
+    rnd = random.Random(seed)
+    return {
+        'next': 'http://127.0.0.1:8000/api/v1/products/?cursor=cD0xMDA%3D',
+        'previous': None,
+        'results': [{
+            'name': f'Товар {number}',
+            'model': f'model/{number % 1000}',
+            'price': rnd.randint(100, 100000),
+            'price_rrc': rnd.randint(100, 100000),
+            'quantity': rnd.randint(0, 50),
+            'category': f'Категория {number % 20}',
+            'shop': 1,
+            'parameters': [{'parameter': 'Цвет', 'value': rnd.choice(['черный', 'белый', 'красный'])},
+                           {'parameter': 'Вес (г)', 'value': str(rnd.randint(10, 5000))}],
+        } for number in range(count)],
+    }
+
+
+def orders_payload(count, positions=5, seed=0):
+    """
+    Ответ списка заказов в формате OrderSerializer (с датами и Decimal, как в DRF)
+    """
+    rnd = random.Random(seed)
+    started = timezone.make_aware(datetime(2026, 1, 1))
+    return [{
+        'id': number,
+        'positions': [{'id': number * positions + position, 'order': number, 'product': f'Товар {position}',
+                       'product_id': position, 'amount': rnd.randint(1, 5)} for position in range(positions)],
+        'status': 'new',
+        'order_datetime': started + timedelta(minutes=number),
+        'address': f'ул. Тестовая, {number}',
+        'total': Decimal(rnd.randint(100, 100000)) / 100,
+    } for number in range(count)]
+
+
+class Command(BaseCommand):
+    help = 'Сравнение скорости рендеринга JSON стандартным JSONRenderer и UJSONRenderer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500, help='число товаров в ответе')
+        parser.add_argument('--orders', type=int, default=200, help='число заказов в ответе')
+        parser.add_argument('--repeat', type=int, default=50, help='число повторов')
+
+    def handle(self, *args, **options):
+        payloads = (('products', products_payload(options['products'])),
+                    ('orders', orders_payload(options['orders'])))
+        for label, data in payloads:
+            timings = {}
+            for renderer in (JSONRenderer(), UJSONRenderer()):
+                body = renderer.render(data)
+                elapsed = min(timeit.repeat(lambda: renderer.render(data), number=options['repeat'], repeat=3))
+                timings[type(renderer).__name__] = elapsed / options['repeat']
+                self.stdout.write(f'{label}: {type(renderer).__name__}: {len(body)} bytes, '
+                                  f'{elapsed / options["repeat"] * 1000:.2f} ms')
+            self.stdout.write(f"{label}: speedup x{timings['JSONRenderer'] / timings['UJSONRenderer']:.1f}")
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management import BaseCommand
+
+from backend.fast_serializers import ProductRowSerializer
+from backend.models import Category, Product
+from backend.serializers import ProductSerializer
+
+
+def product_rows(count):
+    """
+    Товары в памяти и такие же строки values() для ProductRowSerializer
+    """
+    categories = [Category(id=number, name=f'Категория {number}') for number in range(20)]
+    products, rows = [], []
+    for number in range(count):
+        category = categories[number % len(categories)]
+        attributes = {'Цвет': 'черный', 'Вес (г)': str(number % 5000)}
+        products.append(Product(id=number, name=f'Товар {number}', model=f'model/{number % 1000}', price=number,
+                                price_rrc=number, quantity=number % 50, category=category, shop_id=1,
+                                attributes=attributes))
+        rows.append({'id': number, 'name': f'Товар {number}', 'model': f'model/{number % 1000}', 'price': number,
+                     'price_rrc': number, 'quantity': number % 50, 'category__name': category.name, 'shop_id': 1,
+                     'attributes': attributes})
+    return products, rows
+
+
+class Command(BaseCommand):
+    help = 'Стоимость сериализации строки: ProductSerializer против ProductRowSerializer (без базы)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='число строк в ответе')
+
+    def handle(self, *args, **options):
+        products, rows = product_rows(options['rows'])
+        timings = {}
+        for label, serialize in (('ProductSerializer', lambda: ProductSerializer(products, many=True).data),
+                                 ('ProductRowSerializer', lambda: ProductRowSerializer().to_representation(rows))):
+            started = time.perf_counter()
+            data = serialize()
+            timings[label] = time.perf_counter() - started
+            self.stdout.write(f'{label}: {len(data)} rows, {timings[label] * 1000:.1f} ms, '
+                              f'{timings[label] / len(data) * 1e6:.2f} us/row')
+        self.stdout.write(f"speedup x{timings['ProductSerializer'] / timings['ProductRowSerializer']:.1f}")
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from backend.export import export_catalog, EXPORT_FORMATS
+from backend.models import Shop
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка каталога магазина в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop', help='название магазина')
+        parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='ndjson', help='формат выгрузки')
+        parser.add_argument('--gzip', action='store_true', help='сжимать вывод gzip')
+        parser.add_argument('-o', '--output', help='файл для выгрузки (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        try:
+            shop = Shop.objects.get(name=options['shop'])
+        except Shop.DoesNotExist as exc:
+            raise CommandError(exc)
+
+        chunks = export_catalog(shop.id, options['format'], compress=options['gzip'])
+        if options['output']:
+            with open(options['output'], 'wb') as stream:
+                for chunk in chunks:
+                    stream.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
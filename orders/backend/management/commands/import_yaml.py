@@ -1,39 +1,174 @@
+import glob
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
 import yaml
-from django.core.management import BaseCommand
-from yaml import load as load_yaml, Loader
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, DatabaseError
+
+from backend.catalog import import_price_list
+from backend.copy_importer import CopyPriceListImporter
+from backend.importer import PriceListImporter
+from backend.price_parser import iter_price_list
+from backend.validation import PriceListValidationError
+
+
+def collect_files(patterns):
+    """
+    Разворачивает список файлов, каталогов и glob-шаблонов в список YAML-файлов
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.extend(sorted(glob.glob(os.path.join(pattern, '*.yaml')) +
+                                glob.glob(os.path.join(pattern, '*.yml'))))
+        elif glob.has_magic(pattern):
+            files.extend(sorted(glob.glob(pattern)))
+        elif os.path.isfile(pattern):
+            files.append(pattern)
+        else:
+            raise CommandError(f'Файл не найден: {pattern}')
+    # один и тот же файл, указанный дважды, импортируется один раз
+    return list(dict.fromkeys(files))
+
+
+def read_shop_name(path):
+    """
+    Читает только начало файла, чтобы узнать магазин прайса
+    """
+    with open(path, 'rb') as stream:
+        for key, value in iter_price_list(stream):
+            return value if key == 'shop' else None
+
+
+def init_worker():
+    """
+    Каждый процесс пула работает со своим соединением с БД
+    """
+    django.setup()
+    connections.close_all()
+
 
-# Create your views here.
-from backend.models import Shop, Category, Product, Parameter, ProductParameter
+def import_files(shop, paths, copy=False):
+    """
+    Импортирует по очереди файлы одного магазина; выполняется в процессе пула
+    """
+    importer_class = CopyPriceListImporter if copy else PriceListImporter
+    reports = []
+    for path in paths:
+        started = time.monotonic()
+        report = {'path': path}
+        try:
+            with open(path, 'rb') as stream:
+                result = import_price_list(stream, importer_class=importer_class)
+        except PriceListValidationError as exc:
+            report['error'] = str(exc)
+            report['validation'] = exc.report
+        except (yaml.YAMLError, ValueError, KeyError, DatabaseError) as exc:
+            report['error'] = str(exc)
+        else:
+            report.update(result.as_dict(), shop=shop,
+                          rows=result.created + result.updated + result.unchanged)
+        report['seconds'] = time.monotonic() - started
+        reports.append(report)
+    return reports
+
+
+def failed_reports(shop, paths, exc):
+    """
+    Отчеты по файлам магазина, если процесс импорта завершился ошибкой, не вернув отчетов;
+    файлы магазина загружаются по очереди, поэтому часть из них могла быть загружена
+    """
+    return [{'path': path, 'shop': shop, 'error': f'{type(exc).__name__}: {exc}'} for path in paths]
+
+
+def format_row_error(error):
+    """
+    Строка отчета проверки: номер строки прайса, id товара и ошибки по полям
+    """
+    where = 'документ' if error['row'] is None else f"строка {error['row']} (id {error['id']})"
+    fields = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+    return f'  {where}: {fields}'
 
 
 class Command(BaseCommand):
+    help = 'Импорт прайс-листов из YAML-файлов; разные магазины загружаются параллельно'
+
     def add_arguments(self, parser):
-        pass
+        parser.add_argument('paths', nargs='*', default=['data/shop1.yaml'],
+                            help='файлы, каталоги или glob-шаблоны с прайсами')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='число процессов импорта')
+        parser.add_argument('--copy', action='store_true',
+                            help='загрузка через COPY FROM STDIN (PostgreSQL), для первичного наполнения каталога')
+        parser.add_argument('--errors-file',
+                            help='файл для отчетов проверки прайсов с ошибками (JSON Lines, по строке на файл)')
 
     def handle(self, *args, **options):
+        files = collect_files(options['paths'])
+        if not files:
+            raise CommandError('Не найдено ни одного прайса')
 
-        with open('data/shop1.yaml', encoding="UTF-8") as stream:
-            data = load_yaml(stream, Loader=Loader)
+        # файлы одного магазина нельзя загружать одновременно
+        by_shop = defaultdict(list)
+        for path in files:
             try:
-                shop = Shop.objects.get_or_create(name=data['shop'])
-
-                for category in data['categories']:
-                    category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                for item in data['goods']:
-                    product, _ = Product.objects.get_or_create(external_id=item['id'],
-                                                               name=item['name'],
-                                                               category_id=item['category'],
-                                                               model=item['model'],
-                                                               price=item['price'],
-                                                               price_rrc=item['price_rrc'],
-                                                               quantity=item['quantity'],
-                                                               shop_id=shop[0].id
-                                                               )
-                #
-                    for name, value in item['parameters'].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_id=product.id,
-                                                        parameter_id=parameter_object.id,
-                                                        value=value)
+                by_shop[read_shop_name(path)].append(path)
             except yaml.YAMLError as exc:
-                print(exc)
+                self.stderr.write(f'{path}: {exc}')
+
+        started = time.monotonic()
+        workers = max(1, min(options['workers'], len(by_shop)))
+        reports = []
+        if workers == 1:
+            for shop, paths in by_shop.items():
+                try:
+                    reports.extend(import_files(shop, paths, options['copy']))
+                except Exception as exc:
+                    reports.extend(failed_reports(shop, paths, exc))
+        else:
+            # дочерние процессы не должны унаследовать открытые соединения
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                futures = {pool.submit(import_files, shop, paths, options['copy']): (shop, paths)
+                           for shop, paths in by_shop.items()}
+                for future in as_completed(futures):
+                    # ошибка базы в одном процессе не должна прерывать импорт остальных магазинов
+                    try:
+                        reports.extend(future.result())
+                    except Exception as exc:
+                        reports.extend(failed_reports(*futures[future], exc))
+
+        self.print_summary(reports, time.monotonic() - started)
+        if options['errors_file']:
+            self.write_errors(reports, options['errors_file'])
+
+    def print_summary(self, reports, elapsed):
+        total_rows, failed = 0, 0
+        for report in sorted(reports, key=lambda item: item['path']):
+            if 'error' in report:
+                self.stderr.write(f"{report['path']}: ошибка: {report['error']}")
+                for error in report.get('validation', {}).get('errors', []):
+                    self.stderr.write(format_row_error(error))
+                failed += 1
+                continue
+            total_rows += report['rows']
+            rate = report['rows'] / report['seconds'] if report['seconds'] else 0
+            self.stdout.write(f"{report['path']} [{report['shop']}]: created: {report['created']}, "
+                              f"updated: {report['updated']}, unchanged: {report['unchanged']}, "
+                              f"removed: {report['removed']}, skipped: {report['skipped']}, "
+                              f"{report['seconds']:.2f} s, {rate:.0f} rows/s")
+        rate = total_rows / elapsed if elapsed else 0
+        self.stdout.write(f"files: {len(reports)}, failed: {failed}, rows: {total_rows}, "
+                          f"{elapsed:.2f} s, {rate:.0f} rows/s")
+
+    def write_errors(self, reports, path):
+        with open(path, 'w', encoding='utf-8') as stream:
+            for report in sorted(reports, key=lambda item: item['path']):
+                if 'validation' in report:
+                    stream.write(json.dumps({'path': report['path'], **report['validation']}, ensure_ascii=False))
+                    stream.write('\n')
@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand, CommandError
+
+from backend.catalog import rollback_catalog
+from backend.models import Shop
+
+
+class Command(BaseCommand):
+    help = 'Возврат каталога магазина к предыдущей опубликованной версии прайса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop', help='название магазина')
+
+    def handle(self, *args, **options):
+        try:
+            shop = Shop.objects.get(name=options['shop'])
+            result = rollback_catalog(shop)
+        except (Shop.DoesNotExist, ValueError) as exc:
+            raise CommandError(exc)
+
+        self.stdout.write(f"created: {result.created}, updated: {result.updated}, "
+                          f"unchanged: {result.unchanged}, removed: {result.removed}")
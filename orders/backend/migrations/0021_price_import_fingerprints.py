@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0020_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='price_checksum',
+            field=models.CharField(blank=True, max_length=64, verbose_name='Контрольная сумма прайса'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='is_active',
+            field=models.BooleanField(default=True, verbose_name='Есть в прайсе'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=40, verbose_name='Отпечаток строки прайса'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0021_price_import_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('building', 'Собирается'), ('published', 'Опубликована'), ('archived', 'В архиве')], default='building', max_length=15, verbose_name='Статус')),
+                ('checksum', models.CharField(blank=True, max_length=64, verbose_name='Контрольная сумма прайса')),
+                ('categories', models.JSONField(default=list, verbose_name='Категории')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('published_at', models.DateTimeField(blank=True, null=True, verbose_name='Опубликована')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='catalog_versions', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Версия каталога',
+                'verbose_name_plural': 'Версии каталога',
+            },
+        ),
+        migrations.CreateModel(
+            name='CatalogItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.JSONField(verbose_name='Строка прайса')),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='backend.catalogversion', verbose_name='Версия каталога')),
+            ],
+            options={
+                'verbose_name': 'Строка версии каталога',
+                'verbose_name_plural': 'Строки версии каталога',
+            },
+        ),
+    ]
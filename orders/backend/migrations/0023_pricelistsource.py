@@ -0,0 +1,33 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0022_catalogversion_catalogitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceListSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500, verbose_name='Адрес прайса')),
+                ('etag', models.CharField(blank=True, max_length=200, verbose_name='ETag')),
+                ('last_modified', models.CharField(blank=True, max_length=50, verbose_name='Last-Modified')),
+                ('fetched_at', models.DateTimeField(blank=True, null=True, verbose_name='Загружен')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_sources', to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Источник прайса',
+                'verbose_name_plural': 'Источники прайсов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricelistsource',
+            constraint=models.UniqueConstraint(fields=('shop', 'url'), name='unique_shop_price_url'),
+        ),
+    ]
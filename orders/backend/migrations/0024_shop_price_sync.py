@@ -0,0 +1,38 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0023_pricelistsource'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='price_url',
+            field=models.URLField(blank=True, max_length=500, verbose_name='Адрес прайса'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='sync_interval',
+            field=models.PositiveIntegerField(default=1440, verbose_name='Интервал синхронизации прайса, мин'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='next_sync_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Следующая синхронизация'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='sync_started_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Синхронизация запущена'),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='sync_failures',
+            field=models.PositiveIntegerField(default=0, verbose_name='Неудачных синхронизаций подряд'),
+        ),
+    ]
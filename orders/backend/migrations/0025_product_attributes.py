@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_attributes(apps, schema_editor):
+    """
+    Переносит значения ProductParameter в Product.attributes
+    """
+    Product = apps.get_model('backend', 'Product')
+    ProductParameter = apps.get_model('backend', 'ProductParameter')
+
+    rows = (ProductParameter.objects.order_by('product_id', 'id')
+            .values_list('product_id', 'parameter__name', 'value'))
+    batch, product_id, attributes = [], None, {}
+    for row_product_id, name, value in rows.iterator(chunk_size=BATCH_SIZE):
+        if row_product_id != product_id:
+            if product_id is not None:
+                batch.append(Product(id=product_id, attributes=attributes))
+            product_id, attributes = row_product_id, {}
+        attributes[name] = value
+        if len(batch) >= BATCH_SIZE:
+            Product.objects.bulk_update(batch, ['attributes'])
+            batch = []
+    if product_id is not None:
+        batch.append(Product(id=product_id, attributes=attributes))
+    Product.objects.bulk_update(batch, ['attributes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0024_shop_price_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='attributes',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Параметры'),
+        ),
+        migrations.RunPython(fill_attributes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['attributes'], name='product_attributes_gin',
+                                                           opclasses=['jsonb_path_ops']),
+        ),
+    ]
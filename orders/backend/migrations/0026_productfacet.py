@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_FACETS_SQL = """
+    INSERT INTO backend_productfacet (shop_id, category_id, parameter, value, count)
+    SELECT p.shop_id, p.category_id, a.key, a.value, count(*)
+    FROM backend_product p, jsonb_each_text(p.attributes) a
+    WHERE p.is_active
+    GROUP BY p.shop_id, p.category_id, a.key, a.value
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0025_product_attributes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('parameter', models.CharField(max_length=200, verbose_name='Параметр')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('count', models.PositiveIntegerField(verbose_name='Число товаров')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets',
+                                               to='backend.category', verbose_name='Категория')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets',
+                                           to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Фасет',
+                'verbose_name_plural': 'Фасеты',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productfacet',
+            constraint=models.UniqueConstraint(fields=('shop', 'category', 'parameter', 'value'),
+                                               name='unique_product_facet'),
+        ),
+        migrations.AddIndex(
+            model_name='productfacet',
+            index=models.Index(fields=['category', 'parameter'], name='product_facet_category'),
+        ),
+        migrations.RunSQL(FILL_FACETS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_TRIGGER_SQL = """
+    CREATE FUNCTION backend_product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(NEW.model, '')), 'B') ||
+            setweight(jsonb_to_tsvector('russian', coalesce(NEW.attributes, '{}'), '["string"]'), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER backend_product_search_vector
+        BEFORE INSERT OR UPDATE OF name, model, attributes ON backend_product
+        FOR EACH ROW EXECUTE FUNCTION backend_product_search_vector();
+
+    UPDATE backend_product SET name = name;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER_SQL = """
+    DROP TRIGGER backend_product_search_vector ON backend_product;
+    DROP FUNCTION backend_product_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0026_productfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_TRIGGER_SQL, DROP_SEARCH_VECTOR_TRIGGER_SQL),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'],
+                                                           name='product_search_vector_gin'),
+        ),
+    ]
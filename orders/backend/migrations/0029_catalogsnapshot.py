@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0028_product_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.BinaryField(verbose_name='JSON в gzip')),
+                ('checksum', models.CharField(max_length=40, verbose_name='Контрольная сумма JSON')),
+                ('products', models.PositiveIntegerField(verbose_name='Число товаров')),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                               related_name='snapshots', to='backend.category',
+                                               verbose_name='Категория')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots',
+                                           to='backend.shop', verbose_name='Магазин')),
+            ],
+            options={
+                'verbose_name': 'Снимок каталога',
+                'verbose_name_plural': 'Снимки каталога',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='catalogsnapshot',
+            constraint=models.UniqueConstraint(fields=('shop', 'category'), name='unique_catalog_snapshot'),
+        ),
+        migrations.AddConstraint(
+            model_name='catalogsnapshot',
+            constraint=models.UniqueConstraint(condition=models.Q(category=None), fields=('shop',),
+                                               name='unique_shop_catalog_snapshot'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def merge_duplicate_products(apps, schema_editor):
+    """
+    Прежний импорт создавал новый товар при любом изменении строки прайса, поэтому у магазина
+    могли накопиться товары с одинаковым external_id. Остается самый новый, заказы и недостающие
+    у него параметры переносятся на него, остальные удаляются. Параметры оставшегося товара
+    пересобираются в attributes, а отпечаток сбрасывается, чтобы следующий импорт обновил товар
+    """
+    Product = apps.get_model('backend', 'Product')
+    ProductParameter = apps.get_model('backend', 'ProductParameter')
+    OrderPosition = apps.get_model('backend', 'OrderPosition')
+
+    duplicates = list(Product.objects
+                      .values('shop_id', 'external_id')
+                      .annotate(count=Count('id'), keep=Max('id'))
+                      .filter(count__gt=1)
+                      .values_list('shop_id', 'external_id', 'keep'))
+    for shop_id, external_id, keep in duplicates:
+        others = list(Product.objects.filter(shop_id=shop_id, external_id=external_id)
+                      .exclude(id=keep).values_list('id', flat=True))
+
+        for position in OrderPosition.objects.filter(product_id__in=others).order_by('id'):
+            existing = None
+            if position.order_id is not None:
+                existing = OrderPosition.objects.filter(order_id=position.order_id, product_id=keep).first()
+            if existing is None:
+                position.product_id = keep
+                position.save(update_fields=['product'])
+            else:
+                # позиция с этим товаром в заказе уже есть (unique_order_item): количества складываются
+                existing.amount += position.amount
+                existing.save(update_fields=['amount'])
+                position.delete()
+
+        kept = set(ProductParameter.objects.filter(product_id=keep).values_list('parameter_id', flat=True))
+        for parameter in ProductParameter.objects.filter(product_id__in=others).order_by('-product_id', 'id'):
+            if parameter.parameter_id not in kept:
+                kept.add(parameter.parameter_id)
+                parameter.product_id = keep
+                parameter.save(update_fields=['product'])
+        ProductParameter.objects.filter(product_id__in=others).delete()
+        Product.objects.filter(id__in=others).delete()
+
+        # каталог читает параметры из attributes (миграция 0025)
+        attributes = dict(ProductParameter.objects.filter(product_id=keep)
+                          .order_by('parameter__name')
+                          .values_list('parameter__name', 'value'))
+        Product.objects.filter(id=keep).update(attributes=attributes, fingerprint='')
+
+
+class Migration(migrations.Migration):
+    # индексы строятся CONCURRENTLY, без блокировки записи, а это невозможно внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('backend', '0029_catalogsnapshot'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(is_active=True), fields=['shop', 'category', 'id'],
+                               name='product_shop_category_active'),
+        ),
+        AddIndexConcurrently(
+            model_name='product',
+            index=models.Index(condition=models.Q(is_active=True), fields=['category', 'id'],
+                               name='product_category_active'),
+        ),
+        migrations.RunPython(merge_duplicate_products, migrations.RunPython.noop, atomic=True),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('shop', 'external_id'), name='unique_shop_external_id'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(status='basket'), fields=['user'], name='order_basket_user'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0030_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=50, unique=True, verbose_name='ИД задачи')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                           related_name='price_import_jobs', to=settings.AUTH_USER_MODEL,
+                                           verbose_name='Поставщик')),
+            ],
+            options={
+                'verbose_name': 'Задача импорта прайса',
+                'verbose_name_plural': 'Задачи импорта прайсов',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+def move_price_urls(apps, schema_editor):
+    """
+    Адрес синхронизации хранится только в источнике прайса: переносим его из Shop.price_url
+    """
+    Shop = apps.get_model('backend', 'Shop')
+    PriceListSource = apps.get_model('backend', 'PriceListSource')
+    for shop_id, url in Shop.objects.exclude(price_url='').values_list('id', 'price_url'):
+        PriceListSource.objects.get_or_create(shop_id=shop_id, url=url)
+        PriceListSource.objects.filter(shop_id=shop_id).exclude(url=url).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backend', '0031_priceimportjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_price_urls, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='shop',
+            name='price_url',
+        ),
+    ]
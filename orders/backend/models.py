@@ -2,6 +2,8 @@ from datetime import datetime, timedelta
 import jwt
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
@@ -17,6 +19,12 @@ STATE_CHOICES = (
     ('canceled', 'Отменен'),
 )
 
+CATALOG_STATE_CHOICES = (
+    ('building', 'Собирается'),
+    ('published', 'Опубликована'),
+    ('archived', 'В архиве'),
+)
+
 
 class UserManager(BaseUserManager):
 
@@ -141,6 +149,44 @@ class Shop(models.Model):
     """
     name = models.CharField(max_length=50, verbose_name='Название', unique=True)
     state = models.BooleanField(verbose_name='статус получения заказов', default=True)
+    price_checksum = models.CharField(max_length=64, verbose_name='Контрольная сумма прайса', blank=True)
+    sync_interval = models.PositiveIntegerField(verbose_name='Интервал синхронизации прайса, мин', default=1440)
+    next_sync_at = models.DateTimeField(verbose_name='Следующая синхронизация', null=True, blank=True)
+    sync_started_at = models.DateTimeField(verbose_name='Синхронизация запущена', null=True, blank=True)
+    sync_failures = models.PositiveIntegerField(verbose_name='Неудачных синхронизаций подряд', default=0)
+
+
+class PriceListSource(models.Model):
+    """
+    Класс для адреса прайса магазина и валидаторов его последней загрузки;
+    по этому адресу идет и фоновая синхронизация прайса
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='price_sources', on_delete=models.CASCADE)
+    url = models.URLField(max_length=500, verbose_name='Адрес прайса')
+    etag = models.CharField(max_length=200, verbose_name='ETag', blank=True)
+    last_modified = models.CharField(max_length=50, verbose_name='Last-Modified', blank=True)
+    fetched_at = models.DateTimeField(verbose_name='Загружен', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Источник прайса'
+        verbose_name_plural = 'Источники прайсов'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'url'], name='unique_shop_price_url'),
+        ]
+
+
+class PriceImportJob(models.Model):
+    """
+    Класс для задачи импорта прайса и поставщика, который её запустил
+    """
+    job_id = models.CharField(max_length=50, verbose_name='ИД задачи', unique=True)
+    user = models.ForeignKey(User, verbose_name='Поставщик', related_name='price_import_jobs',
+                             on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача импорта прайса'
+        verbose_name_plural = 'Задачи импорта прайсов'
 
 
 class Provider(models.Model):
@@ -188,6 +234,29 @@ class Product(models.Model):
                                  on_delete=models.CASCADE)
     shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='shop_product', blank=True,
                              on_delete=models.CASCADE)
+    is_active = models.BooleanField(verbose_name='Есть в прайсе', default=True)
+    fingerprint = models.CharField(max_length=40, verbose_name='Отпечаток строки прайса', blank=True)
+    # копия значений ProductParameter {имя параметра: значение} для чтения без соединений
+    attributes = models.JSONField(verbose_name='Параметры', default=dict, blank=True)
+    # заполняется триггером базы по name, model и значениям attributes (миграция 0027)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['attributes'], name='product_attributes_gin', opclasses=['jsonb_path_ops']),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
+            GinIndex(fields=['name'], name='product_name_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['model'], name='product_model_trgm', opclasses=['gin_trgm_ops']),
+            # страницы каталога магазина и категории: фильтр по is_active, курсор по id
+            models.Index(fields=['shop', 'category', 'id'], name='product_shop_category_active',
+                         condition=models.Q(is_active=True)),
+            models.Index(fields=['category', 'id'], name='product_category_active',
+                         condition=models.Q(is_active=True)),
+        ]
+        constraints = [
+            # ключ сопоставления товаров при импорте прайса
+            models.UniqueConstraint(fields=['shop', 'external_id'], name='unique_shop_external_id'),
+        ]
 
     def __str__(self):
         return self.name
@@ -214,6 +283,84 @@ class ProductParameter(models.Model):
     value = models.CharField(max_length=100, verbose_name='Значение')
 
 
+class ProductFacet(models.Model):
+    """
+    Класс для числа товаров магазина в категории с данным значением параметра
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='facets', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='facets',
+                                 on_delete=models.CASCADE)
+    parameter = models.CharField(max_length=200, verbose_name='Параметр')
+    value = models.CharField(max_length=100, verbose_name='Значение')
+    count = models.PositiveIntegerField(verbose_name='Число товаров')
+
+    class Meta:
+        verbose_name = 'Фасет'
+        verbose_name_plural = 'Фасеты'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'category', 'parameter', 'value'], name='unique_product_facet'),
+        ]
+        indexes = [
+            models.Index(fields=['category', 'parameter'], name='product_facet_category'),
+        ]
+
+
+class CatalogSnapshot(models.Model):
+    """
+    Класс для сжатого JSON каталога магазина или его категории
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='snapshots', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, verbose_name='Категория', related_name='snapshots', null=True,
+                                 blank=True, on_delete=models.CASCADE)
+    content = models.BinaryField(verbose_name='JSON в gzip')
+    checksum = models.CharField(max_length=40, verbose_name='Контрольная сумма JSON')
+    products = models.PositiveIntegerField(verbose_name='Число товаров')
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Снимок каталога'
+        verbose_name_plural = 'Снимки каталога'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'category'], name='unique_catalog_snapshot'),
+            models.UniqueConstraint(fields=['shop'], condition=models.Q(category=None),
+                                    name='unique_shop_catalog_snapshot'),
+        ]
+
+
+class CatalogVersion(models.Model):
+    """
+    Класс для версии каталога магазина, собранной из прайса до публикации
+    """
+    shop = models.ForeignKey(Shop, verbose_name='Магазин', related_name='catalog_versions',
+                             on_delete=models.CASCADE)
+    state = models.CharField(max_length=15, verbose_name='Статус', choices=CATALOG_STATE_CHOICES,
+                             default='building')
+    checksum = models.CharField(max_length=64, verbose_name='Контрольная сумма прайса', blank=True)
+    categories = models.JSONField(verbose_name='Категории', default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(verbose_name='Опубликована', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Версия каталога'
+        verbose_name_plural = 'Версии каталога'
+
+    def __str__(self):
+        return f'{self.shop.name} ({self.created_at})'
+
+
+class CatalogItem(models.Model):
+    """
+    Класс для строки прайса в версии каталога
+    """
+    version = models.ForeignKey(CatalogVersion, verbose_name='Версия каталога', related_name='items',
+                                on_delete=models.CASCADE)
+    data = models.JSONField(verbose_name='Строка прайса')
+
+    class Meta:
+        verbose_name = 'Строка версии каталога'
+        verbose_name_plural = 'Строки версии каталога'
+
+
 class Order(models.Model):
     """
     Класс для заказов
@@ -230,6 +377,10 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = "Список заказ"
+        indexes = [
+            # корзина покупателя ищется при каждом обращении к корзине
+            models.Index(fields=['user'], name='order_basket_user', condition=models.Q(status='basket')),
+        ]
 
     def __str__(self):
         return str(self.order_datetime)
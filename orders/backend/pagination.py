@@ -0,0 +1,27 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация каталога товаров по первичному ключу:
+    любая страница выбирается условием id > курсор по индексу, без OFFSET
+    """
+    ordering = 'id'
+    page_size = settings.PRODUCTS_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PRODUCTS_MAX_PAGE_SIZE
+
+
+class ProductSearchPagination(LimitOffsetPagination):
+    """
+    Пагинация результатов поиска: порядок по релевантности не подходит для курсора,
+    поэтому страницы задаются limit/offset. Совпадения считаются не дальше
+    PRODUCTS_SEARCH_MAX_RESULTS (без сортировки и ранга), и дальше этой границы
+    страницы не листаются
+    """
+    default_limit = settings.PRODUCTS_PAGE_SIZE
+    max_limit = settings.PRODUCTS_MAX_PAGE_SIZE
+
+    def get_count(self, queryset):
+        return queryset.order_by().values('id')[:settings.PRODUCTS_SEARCH_MAX_RESULTS].count()
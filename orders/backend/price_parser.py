@@ -0,0 +1,137 @@
+"""
+Потоковый разбор YAML прайс-листов.
+
+Документ не строится в памяти целиком: парсер (по возможности на C, через
+libyaml) выдает события, а из них собираются по одному элементы списков
+``categories`` и ``goods``. Импорт получает их пакетами фиксированного
+размера, поэтому расход памяти не зависит от размера файла.
+"""
+import yaml
+from yaml import events
+from yaml.composer import ComposerError
+from yaml.constructor import SafeConstructor
+from yaml.nodes import ScalarNode, SequenceNode, MappingNode
+from yaml.resolver import Resolver
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# ключи документа, списки которых разбираются поэлементно
+STREAMED_KEYS = ('categories', 'goods')
+
+
+class _NodeComposer(Resolver):
+    """
+    Собирает узел YAML из потока событий (аналог yaml.composer.Composer,
+    который недоступен для C-парсера)
+    """
+
+    def __init__(self, event_stream):
+        super().__init__()
+        self.events = event_stream
+        self.anchors = {}
+
+    def compose(self, event):
+        if isinstance(event, events.AliasEvent):
+            if event.anchor not in self.anchors:
+                raise ComposerError(None, None, f"found undefined alias {event.anchor!r}", event.start_mark)
+            return self.anchors[event.anchor]
+
+        if isinstance(event, events.ScalarEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.resolve(ScalarNode, event.value, event.implicit)
+            node = ScalarNode(tag, event.value, event.start_mark, event.end_mark, style=event.style)
+        elif isinstance(event, events.SequenceStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.resolve(SequenceNode, None, event.implicit)
+            node = SequenceNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            for item_event in self.events:
+                if isinstance(item_event, events.SequenceEndEvent):
+                    node.end_mark = item_event.end_mark
+                    break
+                node.value.append(self.compose(item_event))
+        elif isinstance(event, events.MappingStartEvent):
+            tag = event.tag
+            if tag is None or tag == '!':
+                tag = self.resolve(MappingNode, None, event.implicit)
+            node = MappingNode(tag, [], event.start_mark, None, flow_style=event.flow_style)
+            for key_event in self.events:
+                if isinstance(key_event, events.MappingEndEvent):
+                    node.end_mark = key_event.end_mark
+                    break
+                key = self.compose(key_event)
+                node.value.append((key, self.compose(next(self.events))))
+        else:
+            raise ComposerError(None, None, f"unexpected {event.__class__.__name__}", event.start_mark)
+
+        if event.anchor is not None:
+            self.anchors[event.anchor] = node
+        return node
+
+
+def _expect(event, event_class):
+    if not isinstance(event, event_class):
+        raise ComposerError(None, None, f"expected {event_class.__name__}, but found {event.__class__.__name__}",
+                            event.start_mark)
+
+
+def iter_price_list(stream):
+    """
+    Разбирает YAML прайса и выдает пары (ключ, значение) верхнего уровня;
+    для categories и goods выдается каждый элемент списка отдельно
+    """
+    event_stream = yaml.parse(stream, Loader=SafeLoader)
+    composer = _NodeComposer(event_stream)
+    constructor = SafeConstructor()
+
+    _expect(next(event_stream), events.StreamStartEvent)
+    _expect(next(event_stream), events.DocumentStartEvent)
+    _expect(next(event_stream), events.MappingStartEvent)
+
+    for event in event_stream:
+        if isinstance(event, events.MappingEndEvent):
+            break
+        key = constructor.construct_document(composer.compose(event))
+        event = next(event_stream)
+        if key in STREAMED_KEYS and isinstance(event, events.SequenceStartEvent):
+            for item_event in event_stream:
+                if isinstance(item_event, events.SequenceEndEvent):
+                    break
+                yield key, constructor.construct_document(composer.compose(item_event))
+        else:
+            yield key, constructor.construct_document(composer.compose(event))
+
+
+def iter_document(data):
+    """
+    Выдает записи уже загруженного документа в том же виде, что и iter_price_list
+    """
+    for key, value in data.items():
+        if key in STREAMED_KEYS:
+            for item in value:
+                yield key, item
+        else:
+            yield key, value
+
+
+def iter_batches(records, batch_size):
+    """
+    Группирует подряд идущие элементы categories и goods в списки не длиннее batch_size
+    """
+    batch_key, batch = None, []
+    for key, value in records:
+        if batch and (key != batch_key or len(batch) >= batch_size):
+            yield batch_key, batch
+            batch_key, batch = None, []
+        if key in STREAMED_KEYS:
+            batch_key = key
+            batch.append(value)
+        else:
+            yield key, value
+    if batch:
+        yield batch_key, batch
+
@@ -0,0 +1,54 @@
+"""
+Рендерер и парсер JSON для REST API на ujson.
+
+Типы, которых нет в JSON (даты, Decimal, ленивые строки, UUID и т.д.),
+преобразуются тем же ``rest_framework.utils.encoders.JSONEncoder``, что и в
+стандартном ``JSONRenderer``, поэтому ответ совпадает с ответом DRF.
+Запрос с отступами (``Accept: application/json; indent=4``) отдается
+стандартным рендерером.
+"""
+import codecs
+
+import ujson
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders, json
+
+
+class UJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer, кодирующий ответ через ujson
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = ujson.dumps(data, ensure_ascii=self.ensure_ascii, escape_forward_slashes=False,
+                          default=encoders.JSONEncoder().default)
+        # как в JSONRenderer: U+2028 и U+2029 допустимы в JSON, но не в JavaScript
+        return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class UJSONParser(JSONParser):
+    """
+    JSONParser, разбирающий тело запроса через ujson
+    """
+    renderer_class = UJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = codecs.getreader(encoding)(stream).read()
+            if self.strict and ('NaN' in data or 'Infinity' in data):
+                # запрет констант NaN и Infinity есть только в стандартном разборе
+                return json.loads(data)
+            return ujson.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
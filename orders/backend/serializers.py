@@ -189,18 +189,60 @@ class ProductParameterSerializer(serializers.ModelSerializer):
         fields = ('parameter', 'value',)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+def requested_fields(request, serializer_class):
+    """
+    Поля сериализатора, выбранные параметрами запроса: ?fields=name,price - только эти поля,
+    ?expand=positions - из вложенных списков (expandable_fields) только перечисленные, ?expand= - ни одного
+    """
+    fields = list(serializer_class.Meta.fields)
+    if request is None:
+        return fields
+
+    names = request.query_params.get('fields')
+    if names:
+        wanted = {name.strip() for name in names.split(',')}
+        fields = [field for field in fields if field in wanted]
+
+    expand = request.query_params.get('expand')
+    if expand is not None:
+        expanded = {name.strip() for name in expand.split(',')}
+        fields = [field for field in fields
+                  if field not in serializer_class.expandable_fields or field in expanded]
+    return fields
+
+
+class SparseFieldsMixin:
+    """
+    Оставляет в сериализаторе верхнего уровня только поля, выбранные ?fields= и ?expand=
+    """
+    expandable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        allowed = set(requested_fields(self.context.get('request'), type(self)))
+        for name in list(self.fields):
+            if name not in allowed:
+                self.fields.pop(name)
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для товара
     """
     category = serializers.StringRelatedField()
-    parameters = ProductParameterSerializer(read_only=True, many=True)
+    # параметры берутся из Product.attributes в формате ProductParameterSerializer
+    parameters = serializers.SerializerMethodField()
+
+    expandable_fields = ('parameters',)
 
     class Meta:
         model = Product
         fields = ('name', 'model', 'price', 'price_rrc', 'quantity', 'category', 'shop', 'parameters')
         read_only_fields = ('id',)
 
+    def get_parameters(self, obj):
+        return [{'parameter': name, 'value': value} for name, value in sorted(obj.attributes.items())]
+
 
 class OrderPositionSerializer(serializers.ModelSerializer):
     """
@@ -217,12 +259,14 @@ class OrderPositionSerializer(serializers.ModelSerializer):
         }
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для заказа
     """
     positions = OrderPositionSerializer(read_only=True, many=True)
 
+    expandable_fields = ('positions',)
+
     class Meta:
         model = Order
         fields = ('id', 'positions', 'status', 'order_datetime', "address")
@@ -0,0 +1,43 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from backend.cache import invalidate, invalidate_shop_visibility
+from backend.importer import catalog_imported
+from backend.models import Shop, Order, OrderPosition
+from backend.tasks import build_catalog_snapshots
+
+# поля магазина, которые видны в каталоге
+SHOP_VISIBLE_FIELDS = {'name', 'state'}
+
+
+@receiver(post_save, sender=Shop)
+def shop_changed(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Инвалидирует кэш каталога при изменении названия или статуса магазина
+    """
+    if update_fields is None or SHOP_VISIBLE_FIELDS & set(update_fields):
+        invalidate_shop_visibility(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, **kwargs):
+    """
+    Меняет версию заказов покупателя (ETag списка заказов и корзины)
+    """
+    invalidate(f'orders:{instance.user_id}')
+
+
+@receiver([post_save, post_delete], sender=OrderPosition)
+def order_position_changed(sender, instance, **kwargs):
+    user_id = Order.objects.filter(id=instance.order_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        invalidate(f'orders:{user_id}')
+
+
+@receiver(catalog_imported)
+def catalog_changed(sender, shop_id, **kwargs):
+    """
+    Пересобирает снимки каталога магазина после фиксации импорта
+    """
+    transaction.on_commit(lambda: build_catalog_snapshots.delay(shop_id=shop_id))
@@ -0,0 +1,124 @@
+"""
+Снимки каталога: первая страница списка товаров магазина и каждой его
+категории в виде заранее сериализованного и сжатого gzip ответа.
+
+Снимок - это ответ ``ProductsViewSet.list`` без фильтров и курсора со
+страницей размера по умолчанию (с фасетами из ``ProductFacet``): самое
+частое чтение каталога. Ссылка ``next`` зависит от адреса запроса, поэтому
+в снимке хранится остальная часть ответа, а ссылка собирается при отдаче
+по позиции последнего товара страницы; ORM и сериализаторы при этом не
+нужны.
+
+Снимки пересобираются после фиксации импорта прайса. Рядом с ними в кэше
+каталога хранится версия области ``shop:<id>``, при которой снимок собран:
+после следующего изменения магазина снимок не отдается, пока его не
+пересоберут.
+"""
+import gzip
+import hashlib
+import json
+from io import BytesIO
+
+from django.db import transaction
+
+from backend.cache import get_cache, get_versions
+from backend.facets import product_facets
+from backend.fast_serializers import ProductRowSerializer
+from backend.models import CatalogSnapshot, Product
+from backend.pagination import ProductCursorPagination
+
+
+def dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def snapshot_key(shop_id, category_id=None):
+    return f"catalog:snapshot:{shop_id}:{category_id or 'all'}"
+
+
+class SnapshotWriter:
+    """
+    Пишет в gzip ответ списка товаров после ссылки next и считает контрольную сумму JSON
+    """
+
+    def __init__(self):
+        self.buffer = BytesIO()
+        self.file = gzip.GzipFile(fileobj=self.buffer, mode='wb')
+        self.digest = hashlib.sha1()
+        self.products = 0
+        self.write(b'"previous":null,"results":[')
+
+    def write(self, data):
+        self.file.write(data)
+        self.digest.update(data)
+
+    def add(self, item):
+        self.write(b',' + dumps(item) if self.products else dumps(item))
+        self.products += 1
+
+    def close(self, facets):
+        """
+        Дописывает фасеты и возвращает пару (JSON в gzip, контрольная сумма JSON)
+        """
+        self.write(b'],"facets":' + dumps(facets) + b'}')
+        self.file.close()
+        return self.buffer.getvalue(), self.digest.hexdigest()
+
+
+def iter_snapshots(shop_id, page_size):
+    """
+    Выдает четверки (id категории или None, SnapshotWriter с первой страницей, фасеты,
+    позиция курсора следующей страницы или None): сначала весь каталог, затем категории
+    """
+    rows = ProductRowSerializer()
+    active = Product.objects.filter(shop_id=shop_id, is_active=True)
+    products = rows.values(active).order_by('id')
+    category_ids = active.order_by('category_id').values_list('category_id', flat=True).distinct()
+
+    for category_id in [None, *category_ids]:
+        page = products if category_id is None else products.filter(category_id=category_id)
+        # лишняя строка показывает, есть ли следующая страница
+        page = list(page[:page_size + 1])
+        writer = SnapshotWriter()
+        for row in page[:page_size]:
+            writer.add(rows.convert(row))
+        next_position = str(page[page_size - 1]['id']) if len(page) > page_size else None
+        yield category_id, writer, product_facets(None, shop_id, category_id, filtered=False), next_position
+
+
+def build_snapshots(shop_id):
+    """
+    Пересобирает снимки магазина: общий и по категориям
+    """
+    # версия читается до товаров: изменение во время сборки сделает снимки устаревшими
+    version = get_versions([f'shop:{shop_id}'])[0]
+    meta = {}
+    with transaction.atomic():
+        CatalogSnapshot.objects.filter(shop_id=shop_id).delete()
+        for category_id, writer, facets, next_position in iter_snapshots(shop_id, ProductCursorPagination.page_size):
+            content, checksum = writer.close(facets)
+            snapshot = CatalogSnapshot.objects.create(shop_id=shop_id, category_id=category_id, content=content,
+                                                      checksum=checksum, products=writer.products)
+            meta[snapshot_key(shop_id, category_id)] = {'id': snapshot.id, 'version': version,
+                                                        'next': next_position}
+
+    get_cache().set_many(meta, None)
+    return len(meta)
+
+
+def find_snapshot(shop_id, category_id=None):
+    """
+    Снимок включенного магазина (и категории), собранный при текущей версии магазина, либо None;
+    в атрибуте next_position - позиция курсора следующей страницы. Пока снимок не подходит,
+    к базе не обращается
+    """
+    meta = get_cache().get(snapshot_key(shop_id, category_id))
+    if meta is None or meta['version'] != get_versions([f'shop:{shop_id}'])[0]:
+        return None
+    snapshot = (CatalogSnapshot.objects
+                .filter(id=meta['id'], shop__state=True)
+                .only('content', 'checksum')
+                .first())
+    if snapshot is not None:
+        snapshot.next_position = meta['next']
+    return snapshot
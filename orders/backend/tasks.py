@@ -1,12 +1,24 @@
 import logging
+import random
+import time
+from datetime import timedelta
 
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
+from django.db import connection, transaction
+from django.db.models import Q, Exists, OuterRef
 from django.urls import reverse
+from django.utils import timezone
 
-from backend.models import ConfirmEmailToken, ConfirmOrderToken
+from backend.catalog import import_price_source
+from backend.models import ConfirmEmailToken, ConfirmOrderToken, Provider, PriceListSource, Shop
+from backend.snapshots import build_snapshots
+from backend.validation import PriceListValidationError
 from celery import shared_task
 
+# ключ рекомендательной блокировки, под которой планировщик считает идущие синхронизации
+SYNC_SCHEDULE_LOCK_NAMESPACE = 7002
+
 
 @shared_task()
 def new_user_registered(user_id, **kwargs):
@@ -60,3 +72,122 @@ def new_order_created(order_id, address, **kwargs):
     )
     print("verify url:", absurl)
     msg.send()
+
+
+@shared_task(bind=True)
+def do_import(self, url, user_id, **kwargs):
+    """
+    Импортируем прайс поставщика, сообщая о ходе работы через состояние задачи
+    """
+    state = {'user_id': user_id, 'phase': 'downloading', 'processed': 0, 'rows_per_second': 0, 'errors': []}
+    self.update_state(state='PROGRESS', meta=state)
+
+    started = {}
+
+    def report_progress(processed, phase='importing'):
+        # публикация версии каталога снова проходит по всем строкам прайса
+        started.setdefault(phase, time.monotonic())
+        state['phase'] = phase
+        state['processed'] = processed
+        state['rows_per_second'] = round(processed / max(time.monotonic() - started[phase], 0.001))
+        self.update_state(state='PROGRESS', meta=state)
+
+    provider = Provider.objects.filter(provider_id=user_id).select_related('shop').first()
+    if provider is None:
+        state['phase'] = 'failed'
+        state['errors'].append('Поставщик не привязан к магазину')
+        return state
+
+    try:
+        source, _ = PriceListSource.objects.get_or_create(shop=provider.shop, url=url)
+        result = import_price_source(source, progress=report_progress,
+                                     publish_progress=lambda processed: report_progress(processed, 'publishing'))
+    except PriceListValidationError as exc:
+        state['phase'] = 'failed'
+        state['errors'].extend(exc.report['errors'])
+        state['invalid_rows'] = exc.report['invalid_rows']
+        return state
+    except Exception as exc:
+        logging.exception('Price import from %s failed', url)
+        state['phase'] = 'failed'
+        state['errors'].append(str(exc))
+        return state
+
+    state['phase'] = 'done'
+    state['result'] = result.as_dict()
+    return state
+
+
+def next_sync_delay(shop):
+    """
+    Задержка до следующей синхронизации: интервал магазина со случайным сдвигом,
+    после неудач - экспоненциальная пауза, но не дольше интервала
+    """
+    interval = timedelta(minutes=shop.sync_interval)
+    if shop.sync_failures:
+        backoff = timedelta(seconds=settings.PRICE_SYNC_RETRY_DELAY * 2 ** (shop.sync_failures - 1))
+        interval = min(backoff, interval)
+    return interval + interval * random.uniform(0, settings.PRICE_SYNC_JITTER)
+
+
+@shared_task()
+def schedule_price_syncs(**kwargs):
+    """
+    Запускается Celery beat: ставит в очередь синхронизацию магазинов, у которых подошел срок,
+    не превышая PRICE_SYNC_CONCURRENCY одновременно идущих синхронизаций
+    """
+    now = timezone.now()
+    # синхронизация, не завершившаяся за PRICE_SYNC_LEASE секунд, считается потерянной
+    lease_expired = now - timedelta(seconds=settings.PRICE_SYNC_LEASE)
+    running = Q(sync_started_at__gt=lease_expired)
+
+    with transaction.atomic():
+        # без блокировки два запуска по расписанию могут одновременно увидеть свободные места
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, 0)', [SYNC_SCHEDULE_LOCK_NAMESPACE])
+        slots = settings.PRICE_SYNC_CONCURRENCY - Shop.objects.filter(running).count()
+        if slots <= 0:
+            return 0
+        due = list(Shop.objects
+                   .select_for_update(skip_locked=True)
+                   .filter(Exists(PriceListSource.objects.filter(shop=OuterRef('pk'))))
+                   .exclude(running)
+                   .filter(Q(next_sync_at__isnull=True) | Q(next_sync_at__lte=now))
+                   .order_by('next_sync_at')
+                   .values_list('id', flat=True)[:slots])
+        Shop.objects.filter(id__in=due).update(sync_started_at=now)
+        for shop_id in due:
+            transaction.on_commit(lambda shop_id=shop_id: sync_shop_price.delay(shop_id=shop_id))
+    return len(due)
+
+
+@shared_task()
+def sync_shop_price(shop_id, **kwargs):
+    """
+    Загружаем прайс магазина по сохраненному адресу и планируем следующую синхронизацию
+    """
+    shop = Shop.objects.get(id=shop_id)
+    source = shop.price_sources.order_by('-id').first()
+    try:
+        if source is None:
+            raise ValueError('У магазина нет адреса прайса')
+        result = import_price_source(source)
+    except Exception:
+        logging.exception('Price sync for shop %s from %s failed', shop_id, source and source.url)
+        shop.sync_failures += 1
+        result = None
+    else:
+        shop.sync_failures = 0
+
+    shop.sync_started_at = None
+    shop.next_sync_at = timezone.now() + next_sync_delay(shop)
+    shop.save(update_fields=['sync_failures', 'sync_started_at', 'next_sync_at'])
+    return result.as_dict() if result else None
+
+
+@shared_task()
+def build_catalog_snapshots(shop_id):
+    """
+    Пересобирает сжатые снимки каталога магазина
+    """
+    return build_snapshots(shop_id)
@@ -1,8 +1,50 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Prefetch
+from django.test import TestCase, SimpleTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+import yaml
+from yaml import load as load_yaml, Loader
 
-from backend.models import User
+from backend import autocomplete
+from backend.cache import get_versions, version_key
+from backend.catalog import import_price_list, rollback_catalog
+from backend.copy_importer import CopyPriceListImporter
+from backend.facets import product_facets
+from backend.fast_serializers import CategoryRowSerializer, ShopRowSerializer, ProductRowSerializer, \
+    OrderRowSerializer
+from backend.fetcher import fetch_price_list, PriceListTooLarge
+from backend.importer import PriceListImporter
+from backend.models import User, Product, ProductParameter, Shop, CatalogVersion, Customer, Provider, Order, \
+    OrderPosition, Category, PriceImportJob, PriceListSource
+from backend.pagination import ProductCursorPagination
+from backend.price_parser import iter_price_list, iter_document, iter_batches
+from backend.renderers import UJSONRenderer, UJSONParser
+from backend.snapshots import build_snapshots, snapshot_key
+from backend.tasks import schedule_price_syncs, do_import
+from backend.validation import validate_price_list, PriceListValidationError
 from backend.views import AccountCustomerDetails
 
 
@@ -96,4 +138,906 @@ class ProviderTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertTrue(
             "A user with this email and password was not found." in response.json()["non_field_errors"]
-        )
\ No newline at end of file
+        )
+
+
+class PriceImportStatusTestCase(APITestCase):
+
+    def setUp(self):
+        shop = Shop.objects.create(name='Связной')
+        self.owner, self.other = [User.objects.create_user(email, 'verysecret1234', is_active=True,
+                                                           is_provider=True)
+                                  for email in ('owner@example-email.com', 'other@example-email.com')]
+        for user in (self.owner, self.other):
+            Provider.objects.create(provider=user, shop=shop)
+        PriceImportJob.objects.create(job_id='job-1', user=self.owner)
+
+    def test_status_is_visible_to_owner_only(self):
+        job = mock.Mock(state='FAILURE', info=RuntimeError('connection refused'))
+        with mock.patch('backend.views.do_import.AsyncResult', return_value=job) as async_result:
+            self.client.force_authenticate(self.other)
+            for job_id in ('job-1', 'unknown'):
+                response = self.client.get(reverse('backend:price-update-status', args=[job_id]))
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            async_result.assert_not_called()
+
+            self.client.force_authenticate(self.owner)
+            response = self.client.get(reverse('backend:price-update-status', args=['job-1']))
+        self.assertEqual(response.json()['phase'], 'failed')
+        self.assertEqual(response.json()['errors'], ['connection refused'])
+
+    def test_provider_without_shop_is_rejected(self):
+        user = User.objects.create_user('noshop@example-email.com', 'verysecret1234', is_active=True,
+                                        is_provider=True)
+        self.client.force_authenticate(user)
+        with mock.patch('backend.views.do_import.delay') as delay:
+            response = self.client.post(reverse('backend:price-update'), {'url': 'http://example.com/price.yaml'})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(response.json()['Status'])
+        delay.assert_not_called()
+        with mock.patch.object(do_import, 'update_state'):
+            state = do_import(url='http://example.com/price.yaml', user_id=user.id)
+        self.assertEqual(state['phase'], 'failed')
+
+
+class PriceSyncScheduleTestCase(TestCase):
+
+    def setUp(self):
+        for number in range(3):
+            shop = Shop.objects.create(name=f'Магазин {number}')
+            PriceListSource.objects.create(shop=shop, url=f'http://example.com/{number}.yaml')
+        Shop.objects.create(name='Без прайса')
+
+    @override_settings(PRICE_SYNC_CONCURRENCY=2)
+    def test_concurrency_cap(self):
+        self.assertEqual(schedule_price_syncs(), 2)
+        self.assertEqual(schedule_price_syncs(), 0)
+        self.assertFalse(Shop.objects.filter(name='Без прайса', sync_started_at__isnull=False).exists())
+
+
+class PriceListImporterTestCase(TestCase):
+
+    def setUp(self):
+        with open('data/shop1.yaml', encoding="UTF-8") as stream:
+            self.data = load_yaml(stream, Loader=Loader)
+
+    def test_import_creates_products(self):
+        result = PriceListImporter().run(self.data)
+
+        self.assertEqual(result.created, len(self.data['goods']))
+        self.assertEqual(Product.objects.count(), len(self.data['goods']))
+        self.assertEqual(ProductParameter.objects.count(),
+                         sum(len(item['parameters']) for item in self.data['goods']))
+
+    def test_reimport_is_unchanged(self):
+        PriceListImporter().run(self.data)
+        self.data['goods'][0]['price'] += 1
+
+        result = PriceListImporter().run(self.data)
+
+        self.assertEqual(result.as_dict(), {'created': 0, 'updated': 1,
+                                            'unchanged': len(self.data['goods']) - 1,
+                                            'removed': 0, 'skipped': False})
+        self.assertEqual(ProductParameter.objects.count(),
+                         sum(len(item['parameters']) for item in self.data['goods']))
+
+    def test_attributes_follow_parameters(self):
+        PriceListImporter().run(self.data)
+        item = self.data['goods'][0]
+        item['parameters'] = {'Цвет': 'красный', 'Вес (г)': 150}
+
+        PriceListImporter().run(self.data)
+
+        product = Product.objects.get(external_id=item['id'])
+        self.assertEqual(product.attributes, {'Цвет': 'красный', 'Вес (г)': '150'})
+        self.assertEqual(dict(product.parameters.values_list('parameter__name', 'value')), product.attributes)
+
+    def test_missing_products_are_removed(self):
+        PriceListImporter().run(self.data)
+        removed = self.data['goods'].pop()
+
+        result = PriceListImporter().run(self.data)
+
+        self.assertEqual(result.removed, 1)
+        self.assertFalse(Product.objects.get(external_id=removed['id']).is_active)
+
+    def test_same_file_is_skipped(self):
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+        with open('data/shop1.yaml', 'rb') as stream:
+            result = PriceListImporter().run(stream)
+
+        self.assertTrue(result.skipped)
+        self.assertEqual(result.unchanged, len(self.data['goods']))
+
+    def test_checksum_follows_every_import(self):
+        with open('data/shop1.yaml', 'rb') as stream:
+            first = stream.read()
+        second = first.replace(b'price: 110000', b'price: 120000', 1)
+
+        PriceListImporter().run(first)
+        # категории не меняются, но сумма прайса должна обновиться
+        self.assertFalse(PriceListImporter().run(second).skipped)
+        self.assertTrue(PriceListImporter().run(second).skipped)
+
+        result = PriceListImporter().run(first)
+        self.assertFalse(result.skipped)
+        self.assertEqual(result.updated, 1)
+        self.assertTrue(Product.objects.filter(price=110000).exists())
+
+
+    def test_copy_imports_in_one_transaction(self):
+        # TestCase держит внешнюю транзакцию, как и публикация нескольких магазинов подряд
+        CopyPriceListImporter().run(self.data)
+        self.data['shop'] = 'Другой магазин'
+        result = CopyPriceListImporter().run(self.data)
+
+        self.assertEqual(result.created, len(self.data['goods']))
+        self.assertEqual(Product.objects.count(), 2 * len(self.data['goods']))
+
+
+class CatalogVersionTestCase(TestCase):
+
+    def setUp(self):
+        with open('data/shop1.yaml', encoding="UTF-8") as stream:
+            self.data = load_yaml(stream, Loader=Loader)
+
+    def test_publish_and_rollback(self):
+        import_price_list(self.data)
+        old_price = self.data['goods'][0]['price']
+        self.data['goods'][0]['price'] += 1
+        import_price_list(self.data)
+
+        product = Product.objects.get(external_id=self.data['goods'][0]['id'])
+        self.assertEqual(product.price, old_price + 1)
+        self.assertEqual(CatalogVersion.objects.filter(state='published').count(), 1)
+
+        result = rollback_catalog(Shop.objects.get(name=self.data['shop']))
+
+        product.refresh_from_db()
+        self.assertEqual(product.price, old_price)
+        self.assertEqual(result.updated, 1)
+
+    def test_stale_versions_are_pruned_after_commit(self):
+        import_price_list(self.data)
+        shop = Shop.objects.get(name=self.data['shop'])
+        abandoned = CatalogVersion.objects.create(shop=shop)
+        CatalogVersion.objects.filter(id=abandoned.id).update(created_at=timezone.now() - timedelta(days=1))
+        building = CatalogVersion.objects.create(shop=shop)
+
+        for price in (1, 2):
+            self.data['goods'][0]['price'] += price
+            with self.captureOnCommitCallbacks(execute=True):
+                import_price_list(self.data)
+
+        states = sorted(shop.catalog_versions.values_list('state', flat=True))
+        self.assertEqual(states, ['archived', 'building', 'published'])
+        self.assertTrue(CatalogVersion.objects.filter(id=building.id).exists())
+
+    def test_failed_switch_keeps_live_catalog(self):
+        import_price_list(self.data)
+        shop = Shop.objects.get(name=self.data['shop'])
+        old_price, checksum = self.data['goods'][0]['price'], shop.price_checksum
+        self.data['goods'][0]['price'] += 1
+
+        with mock.patch('backend.catalog.activate_catalog_version', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                import_price_list(self.data)
+
+        shop.refresh_from_db()
+        self.assertEqual(Product.objects.get(external_id=self.data['goods'][0]['id']).price, old_price)
+        self.assertEqual(shop.price_checksum, checksum)
+        self.assertEqual(shop.catalog_versions.filter(state='published').count(), 1)
+
+    def test_copy_import_stages_version_through_copy(self):
+        with mock.patch('backend.importer.CatalogItem.objects.bulk_create') as bulk_create:
+            import_price_list(self.data, importer_class=CopyPriceListImporter)
+
+        bulk_create.assert_not_called()
+        version = CatalogVersion.objects.get(state='published')
+        self.assertEqual(list(version.items.order_by('id').values_list('data', flat=True)), self.data['goods'])
+        self.assertEqual(Product.objects.filter(is_active=True).count(), len(self.data['goods']))
+
+
+class ImportCommandTestCase(TestCase):
+
+    def test_failed_shop_does_not_stop_others(self):
+        with open('data/shop1.yaml', encoding='UTF-8') as stream:
+            text = stream.read()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ('a', 'b'):
+            with open(os.path.join(directory, f'{name}.yaml'), 'w', encoding='UTF-8') as stream:
+                stream.write(text.replace('shop: Связной', f'shop: Магазин {name}', 1))
+
+        def import_or_fail(stream, **kwargs):
+            if stream.name.endswith('b.yaml'):
+                raise RuntimeError('server closed the connection unexpectedly')
+            return import_price_list(stream, **kwargs)
+
+        out, err = StringIO(), StringIO()
+        with mock.patch('backend.management.commands.import_yaml.import_price_list', import_or_fail):
+            call_command('import_yaml', directory, workers=1, stdout=out, stderr=err)
+
+        self.assertTrue(Shop.objects.filter(name='Магазин a').exists())
+        self.assertIn('server closed the connection', err.getvalue())
+        self.assertIn('files: 2, failed: 1', out.getvalue())
+
+    def test_validation_errors_are_reported_per_row(self):
+        with open('data/shop1.yaml', encoding='UTF-8') as stream:
+            data = load_yaml(stream, Loader=Loader)
+        data['goods'][0]['price'] = -1
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path, errors_file = os.path.join(directory, 'shop.yaml'), os.path.join(directory, 'errors.jsonl')
+        with open(path, 'w', encoding='UTF-8') as stream:
+            yaml.safe_dump(data, stream, allow_unicode=True)
+
+        err = StringIO()
+        call_command('import_yaml', path, workers=1, errors_file=errors_file, stdout=StringIO(), stderr=err)
+
+        self.assertIn(f"строка 1 (id {data['goods'][0]['id']}): price: ", err.getvalue())
+        with open(errors_file, encoding='utf-8') as stream:
+            report = json.loads(stream.readline())
+        self.assertEqual((report['path'], report['invalid_rows']), (path, 1))
+
+
+class PriceListValidationTestCase(TestCase):
+
+    def setUp(self):
+        with open('data/shop1.yaml', encoding="UTF-8") as stream:
+            self.data = load_yaml(stream, Loader=Loader)
+
+    def test_valid_price_list(self):
+        report = validate_price_list(self.data)
+
+        self.assertEqual(report, {'rows': len(self.data['goods']), 'invalid_rows': 0, 'errors': []})
+
+    def test_errors_are_reported_per_row(self):
+        self.data['goods'][0]['price'] = -1
+        del self.data['goods'][1]['parameters']
+        self.data['goods'][2]['id'] = self.data['goods'][3]['id']
+        self.data['goods'][3]['category'] = 999999
+
+        report = validate_price_list(self.data)
+
+        self.assertEqual(report['invalid_rows'], 3)
+        self.assertEqual([(error['row'], list(error['errors'])) for error in report['errors']],
+                         [(1, ['price']), (2, ['parameters']), (4, ['id', 'category'])])
+
+    def test_invalid_price_list_is_not_imported(self):
+        self.data['goods'][0]['quantity'] = 'много'
+
+        with self.assertRaises(PriceListValidationError):
+            import_price_list(self.data)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(CatalogVersion.objects.exists())
+
+    def test_price_list_of_other_shop_is_rejected(self):
+        shop = Shop.objects.create(name='Другой магазин')
+
+        with self.assertRaises(PriceListValidationError) as context:
+            import_price_list(self.data, shop=shop)
+        self.assertEqual(context.exception.report['errors'][0]['errors'],
+                         {'document': f"Прайс магазина {self.data['shop']}, ожидается {shop.name}"})
+        self.assertEqual(list(Shop.objects.values_list('name', flat=True)), [shop.name])
+
+
+class PriceParserTestCase(SimpleTestCase):
+
+    def test_stream_matches_full_load(self):
+        with open('data/shop1.yaml', 'rb') as stream:
+            data = load_yaml(stream, Loader=Loader)
+            stream.seek(0)
+            records = list(iter_price_list(stream))
+
+        self.assertEqual(records, list(iter_document(data)))
+
+    def test_batches_are_bounded(self):
+        with open('data/shop1.yaml', 'rb') as stream:
+            batches = list(iter_batches(iter_price_list(stream), 2))
+
+        self.assertEqual(batches[0][0], 'shop')
+        self.assertTrue(all(len(value) <= 2 for key, value in batches if key in ('categories', 'goods')))
+
+
+class PriceListHandler(BaseHTTPRequestHandler):
+    """
+    Сервер поставщика: отдает shop1.yaml с ETag и отвечает 304 на условный запрос
+    """
+    etag = '"shop1-v1"'
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        with open('data/shop1.yaml', 'rb') as stream:
+            body = stream.read()
+        self.send_response(200)
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PriceListFetcherTestCase(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), PriceListHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/shop1.yaml'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_fetch_and_not_modified(self):
+        stream, etag, _ = fetch_price_list(self.url)
+        with stream, open('data/shop1.yaml', 'rb') as expected:
+            self.assertEqual(stream.read(), expected.read())
+        self.assertEqual(etag, PriceListHandler.etag)
+
+        stream, etag, _ = fetch_price_list(self.url, etag=etag)
+        self.assertIsNone(stream)
+
+    def test_size_limit(self):
+        with self.assertRaises(PriceListTooLarge):
+            fetch_price_list(self.url, max_size=10)
+
+
+class ProductsPaginationTestCase(APITestCase):
+
+    products_url = reverse('backend:product-list')
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+
+    def test_cursor_pages_cover_catalog(self):
+        response = self.client.get(self.products_url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page = response.json()
+        self.assertEqual(len(first_page['results']), 3)
+        self.assertIsNotNone(first_page['next'])
+
+        with mock.patch('backend.views.product_facets') as facets:
+            second_page = self.client.get(first_page['next']).json()
+        self.assertEqual(len(second_page['results']), Product.objects.count() - 3)
+        self.assertIsNone(second_page['next'])
+        self.assertIn('facets', first_page)
+        self.assertNotIn('facets', second_page)
+        facets.assert_not_called()
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(ProductCursorPagination, 'max_page_size', 2):
+            response = self.client.get(self.products_url, {'page_size': 1000})
+
+        self.assertEqual(len(response.json()['results']), 2)
+
+
+class ProductFacetsTestCase(APITestCase):
+
+    products_url = reverse('backend:product-list')
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+
+    def test_parameter_filter_and_facets(self):
+        response = self.client.get(self.products_url, {'param[Диагональ (дюйм)]': '6.1', 'price_max': 62000})
+        data = response.json()
+
+        self.assertEqual([product['price'] for product in data['results']], [60000])
+        self.assertEqual(data['facets']['Цвет'], {'синий': 1})
+
+    def test_precomputed_facets_match_products(self):
+        data = self.client.get(self.products_url).json()
+
+        self.assertEqual(data['facets'], product_facets(Product.objects.filter(is_active=True)))
+        self.assertEqual(data['facets']['Диагональ (дюйм)'], {'6.1': 3, '6.5': 1})
+
+    def test_invalid_price(self):
+        response = self.client.get(self.products_url, {'price_min': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_ignores_list_filters(self):
+        product = Product.objects.first()
+        response = self.client.get(reverse('backend:product-detail', args=[product.id]), {'price_min': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProductSearchTestCase(APITestCase):
+
+    search_url = reverse('backend:product-search')
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+
+    def test_search_by_parameter_value(self):
+        response = self.client.get(self.search_url, {'q': 'золотистый'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(response.json()['results'][0]['price'], 110000)
+
+    def test_search_vector_follows_changes(self):
+        product = Product.objects.get(attributes__contains={'Цвет': 'синий'})
+        product.name = 'Смартфон Ультра'
+        product.save()
+
+        results = self.client.get(self.search_url, {'q': 'ультра'}).json()['results']
+        self.assertEqual([item['name'] for item in results], ['Смартфон Ультра'])
+
+    def test_empty_query(self):
+        response = self.client.get(self.search_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PRODUCTS_SEARCH_MAX_RESULTS=2)
+    def test_count_is_capped(self):
+        data = self.client.get(self.search_url, {'q': 'iphone', 'limit': 1}).json()
+        self.assertEqual((data['count'], len(data['results'])), (2, 1))
+
+        data = self.client.get(self.search_url, {'q': 'iphone', 'limit': 1, 'offset': 1}).json()
+        self.assertIsNone(data['next'])
+
+
+class ProductAutocompleteTestCase(APITestCase):
+
+    autocomplete_url = reverse('backend:product-autocomplete')
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        autocomplete.clear_cache()
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+
+    def test_prefix_and_typo(self):
+        product = Product.objects.first()
+        for text in (product.name[:4], product.model[:-1] + 'x'):
+            results = self.client.get(self.autocomplete_url, {'q': text}).json()['results']
+            self.assertIn({'name': product.name, 'model': product.model}, results)
+
+    def test_models_are_deduplicated(self):
+        product = Product.objects.first()
+        copy = Product.objects.get(id=product.id)
+        copy.pk, copy.external_id = None, product.external_id + 1
+        copy.save()
+
+        results = self.client.get(self.autocomplete_url, {'q': product.name}).json()['results']
+        self.assertEqual([item['model'] for item in results].count(product.model), 1)
+
+    def test_short_prefix_is_not_queried(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest(Product.objects.first().name[:2]), [])
+
+    @override_settings(PRODUCTS_AUTOCOMPLETE_CANDIDATES=1)
+    def test_limit_is_kept_with_few_candidates(self):
+        # в прайсе две модели: обе должны попасть в подсказки, хотя кандидатов по настройке один
+        results = autocomplete.find_suggestions('смартфон', limit=2)
+        self.assertEqual(len(results), 2)
+
+    def test_hot_prefix_is_cached(self):
+        product = Product.objects.first()
+        autocomplete.suggest(product.name[:4])
+        with self.assertNumQueries(0):
+            autocomplete.suggest(product.name[:4].upper())
+
+
+class CatalogCacheTestCase(APITestCase):
+
+    products_url = reverse('backend:product-list')
+
+    def setUp(self):
+        # снимки каталога пересобирает воркер Celery
+        patcher = mock.patch('backend.signals.build_catalog_snapshots')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', encoding="UTF-8") as stream:
+            self.data = load_yaml(stream, Loader=Loader)
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+        self.shop = Shop.objects.get()
+
+    def test_cached_until_import(self):
+        params = {'shop_id': self.shop.id}
+        self.client.get(self.products_url, params)
+        with self.assertNumQueries(0):
+            self.client.get(self.products_url, params)
+
+        self.data['goods'][0]['price'] += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+
+        prices = [product['price'] for product in self.client.get(self.products_url, params).json()['results']]
+        self.assertIn(self.data['goods'][0]['price'], prices)
+
+    def test_other_shop_import_keeps_entry(self):
+        params = {'shop_id': self.shop.id}
+        self.client.get(self.products_url, params)
+
+        self.data['shop'] = 'Другой магазин'
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+
+        with self.assertNumQueries(0):
+            self.client.get(self.products_url, params)
+
+    def test_category_rename_reaches_other_shops(self):
+        params = {'shop_id': self.shop.id}
+        self.client.get(self.products_url, params)
+
+        self.data['shop'] = 'Другой магазин'
+        category = self.data['categories'][0]
+        category['name'] = 'Телефоны'
+        with mock.patch('backend.signals.build_catalog_snapshots') as build:
+            with self.captureOnCommitCallbacks(execute=True):
+                PriceListImporter().run(self.data)
+
+        build.delay.assert_any_call(shop_id=self.shop.id)
+        renamed = set(Product.objects.filter(shop=self.shop, category_id=category['id'])
+                      .values_list('name', flat=True))
+        results = self.client.get(self.products_url, params).json()['results']
+        self.assertEqual({item['category'] for item in results if item['name'] in renamed}, {'Телефоны'})
+
+    def test_stale_response_while_recomputed(self):
+        params = {'shop_id': self.shop.id}
+        before = self.client.get(self.products_url, params).json()
+        self.data['goods'][0]['price'] += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+
+        # блокировку пересчета держит другой процесс
+        with mock.patch.object(caches[settings.CATALOG_CACHE_ALIAS], 'add', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.client.get(self.products_url, params)
+        self.assertEqual(response.json(), before)
+
+    def test_versions_do_not_expire(self):
+        catalog_cache = caches[settings.CATALOG_CACHE_ALIAS]
+        catalog_cache.delete(version_key('shop:1'))
+        get_versions(['shop:1'])
+        self.assertIsNone(catalog_cache.ttl(version_key('shop:1')))
+
+    @override_settings(CATALOG_CACHE_WAIT=0.1)
+    def test_waits_without_stale_response(self):
+        with mock.patch.object(caches[settings.CATALOG_CACHE_ALIAS], 'add', return_value=False):
+            response = self.client.get(self.products_url, {'category_id': Product.objects.first().category_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_shop_state_change(self):
+        self.assertEqual(len(self.client.get(reverse('backend:shops')).json()), 1)
+
+        self.shop.state = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.save(update_fields=['state'])
+
+        self.assertEqual(self.client.get(reverse('backend:shops')).json(), [])
+        self.assertEqual(self.client.get(self.products_url).json()['results'], [])
+
+
+class ConditionalGetTestCase(APITestCase):
+
+    def setUp(self):
+        # снимки каталога пересобирает воркер Celery
+        patcher = mock.patch('backend.signals.build_catalog_snapshots')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', encoding="UTF-8") as stream:
+            self.data = load_yaml(stream, Loader=Loader)
+        PriceListImporter().run(self.data)
+
+    def test_not_modified_until_import(self):
+        url = reverse('backend:product-list')
+        etag = self.client.get(url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.data['goods'][0]['quantity'] += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_stale_response_keeps_its_etag(self):
+        url = reverse('backend:product-list')
+        etag = self.client.get(url)['ETag']
+        self.data['goods'][0]['quantity'] += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+
+        # пока ответ пересчитывает другой процесс, прежнее тело отдается со своим ETag
+        with mock.patch.object(caches[settings.CATALOG_CACHE_ALIAS], 'add', return_value=False):
+            response = self.client.get(url)
+        self.assertEqual(response['ETag'], etag)
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_basket_version_follows_writes(self):
+        user = User.objects.create_user('buyer@example-email.com', 'verysecret1234', is_active=True)
+        Customer.objects.create(user=user)
+        self.client.force_authenticate(user=user)
+        url = reverse('backend:basket')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(user_id=user.id, status='basket')
+            OrderPosition.objects.create(order=order, product=Product.objects.first(), amount=1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_basket_follows_product_rename(self):
+        user = User.objects.create_user('buyer@example-email.com', 'verysecret1234', is_active=True)
+        Customer.objects.create(user=user)
+        order = Order.objects.create(user_id=user.id, status='basket')
+        OrderPosition.objects.create(order=order, product=Product.objects.get(external_id=self.data['goods'][0]['id']),
+                                     amount=1)
+        self.client.force_authenticate(user=user)
+        url = reverse('backend:basket')
+        etag = self.client.get(url)['ETag']
+
+        self.data['goods'][0]['name'] += ' (новая модель)'
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]['positions'][0]['product'], self.data['goods'][0]['name'])
+
+
+class CatalogSnapshotTestCase(APITestCase):
+
+    products_url = reverse('backend:product-list')
+
+    def setUp(self):
+        patcher = mock.patch('backend.signals.build_catalog_snapshots')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', encoding="UTF-8") as stream:
+            self.data = load_yaml(stream, Loader=Loader)
+        PriceListImporter().run(self.data)
+        self.shop = Shop.objects.get()
+        build_snapshots(self.shop.id)
+
+    def test_snapshot_matches_list(self):
+        for params in ({'shop_id': self.shop.id},
+                       {'shop_id': self.shop.id, 'category_id': Product.objects.first().category_id}):
+            # только чтение байтов снимка
+            with self.assertNumQueries(1):
+                from_snapshot = self.client.get(self.products_url, params).json()
+
+            caches[settings.CATALOG_CACHE_ALIAS].delete(snapshot_key(params['shop_id'], params.get('category_id')))
+            self.assertEqual(from_snapshot, self.client.get(self.products_url, params).json())
+
+    def test_first_page_links_to_next(self):
+        with mock.patch.object(ProductCursorPagination, 'page_size', 2):
+            build_snapshots(self.shop.id)
+            with self.assertNumQueries(1):
+                first_page = self.client.get(self.products_url, {'shop_id': self.shop.id}).json()
+
+            caches[settings.CATALOG_CACHE_ALIAS].delete(snapshot_key(self.shop.id))
+            self.assertEqual(first_page, self.client.get(self.products_url, {'shop_id': self.shop.id}).json())
+            second_page = self.client.get(first_page['next']).json()
+
+        self.assertEqual(len(first_page['results']), 2)
+        self.assertEqual(len(second_page['results']), min(Product.objects.count() - 2, 2))
+
+    def test_gzip(self):
+        response = self.client.get(self.products_url, {'shop_id': self.shop.id}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), Product.objects.count())
+
+    def test_only_default_page_size(self):
+        response = self.client.get(self.products_url, {'shop_id': self.shop.id, 'page_size': 1},
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_import_makes_snapshot_stale(self):
+        self.data['goods'][0]['price'] += 1
+        with self.captureOnCommitCallbacks(execute=True):
+            PriceListImporter().run(self.data)
+
+        results = self.client.get(self.products_url, {'shop_id': self.shop.id}).json()['results']
+        self.assertIn(self.data['goods'][0]['price'], [item['price'] for item in results])
+
+    def test_disabled_shop(self):
+        Shop.objects.filter(id=self.shop.id).update(state=False)
+        response = self.client.get(self.products_url, {'shop_id': self.shop.id})
+        self.assertEqual(response.json()['results'], [])
+
+
+class UJSONRendererTestCase(SimpleTestCase):
+
+    def test_same_output_as_default(self):
+        data = {'name': 'Товар/1', 'date': timezone.now(), 'price': Decimal('10.50'),
+                'label': gettext_lazy('active'), 'items': [1, None, True]}
+        self.assertEqual(json.loads(UJSONRenderer().render(data)), json.loads(JSONRenderer().render(data)))
+
+    def test_parser_roundtrip(self):
+        body = UJSONRenderer().render({'product_id': 1, 'name': 'Товар'})
+        self.assertEqual(UJSONParser().parse(BytesIO(body)), {'product_id': 1, 'name': 'Товар'})
+
+        with self.assertRaises(ParseError):
+            UJSONParser().parse(BytesIO(b'{"price": NaN}'))
+
+
+class RowSerializerTestCase(TestCase):
+
+    def setUp(self):
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+        user = User.objects.create_user('buyer@example-email.com', 'verysecret1234', is_active=True)
+        Customer.objects.create(user=user)
+        for status_name in ('new', 'confirmed'):
+            order = Order.objects.create(user_id=user.id, status=status_name, address='ул. Тестовая, 1')
+            OrderPosition.objects.bulk_create([OrderPosition(order=order, product=product, amount=2)
+                                               for product in Product.objects.all()])
+
+    def assertSameOutput(self, row_serializer_class, queryset, params=None):
+        request = Request(APIRequestFactory().get('/', params or {}))
+        expected = row_serializer_class.serializer_class(queryset, many=True, context={'request': request}).data
+        fast = row_serializer_class(request).data(queryset)
+        self.assertEqual(UJSONRenderer().render(fast), UJSONRenderer().render(expected))
+
+    def test_catalog(self):
+        self.assertSameOutput(CategoryRowSerializer, Category.objects.all())
+        self.assertSameOutput(ShopRowSerializer, Shop.objects.filter(state=True))
+        products = Product.objects.order_by('id')
+        self.assertSameOutput(ProductRowSerializer, products)
+        self.assertSameOutput(ProductRowSerializer, products, {'fields': 'price,category,name', 'expand': ''})
+
+    def test_orders(self):
+        orders = Order.objects.prefetch_related(
+            Prefetch('positions', queryset=OrderPosition.objects.select_related('product').order_by('id')))
+        self.assertSameOutput(OrderRowSerializer, orders)
+        self.assertSameOutput(OrderRowSerializer, orders, {'expand': ''})
+
+
+class CatalogExportTestCase(APITestCase):
+
+    export_url = reverse('backend:product-export')
+
+    def setUp(self):
+        cache.clear()
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+        self.shop = Shop.objects.get()
+
+    def test_ndjson(self):
+        response = self.client.get(self.export_url, {'shop_id': self.shop.id})
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         list(Product.objects.order_by('id').values_list('external_id', flat=True)))
+
+    def test_gzip_csv(self):
+        response = self.client.get(self.export_url, {'shop_id': self.shop.id, 'type': 'csv'},
+                                   HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = list(csv.DictReader(StringIO(gzip.decompress(b''.join(response.streaming_content)).decode())))
+        self.assertEqual(len(rows), Product.objects.count())
+        product = Product.objects.get(external_id=rows[0]['id'])
+        self.assertEqual(json.loads(rows[0]['parameters']), product.attributes)
+
+
+class QueryIndexesTestCase(TestCase):
+    """
+    Частые запросы должны идти по индексам (на маленьких таблицах план проверяется с enable_seqscan = off)
+    """
+
+    def setUp(self):
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+        self.product = Product.objects.first()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn(index_name, plan)
+
+    def test_catalog_page(self):
+        self.assertUsesIndex(Product.objects.filter(shop_id=self.product.shop_id, category_id=self.product.category_id,
+                                                    is_active=True).order_by('id')[:50],
+                             'product_shop_category_active')
+        self.assertUsesIndex(Product.objects.filter(category_id=self.product.category_id,
+                                                    is_active=True).order_by('id')[:50],
+                             'product_category_active')
+
+    def test_import_lookup(self):
+        self.assertUsesIndex(Product.objects.filter(shop_id=self.product.shop_id,
+                                                    external_id__in=[self.product.external_id]),
+                             'unique_shop_external_id')
+
+    def test_basket_lookup(self):
+        self.assertUsesIndex(Order.objects.filter(user_id=1, status='basket'), 'order_basket_user')
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Число запросов к базе у списков не должно зависеть от числа строк
+    """
+
+    def setUp(self):
+        cache.clear()
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        with open('data/shop1.yaml', 'rb') as stream:
+            PriceListImporter().run(stream)
+        products = list(Product.objects.all())
+
+        self.customer = User.objects.create_user('buyer@example-email.com', 'verysecret1234',
+                                                 is_active=True, is_buyer=True)
+        Customer.objects.create(user=self.customer)
+        for status_name in ('basket', 'new', 'confirmed'):
+            order = Order.objects.create(user_id=self.customer.id, status=status_name)
+            OrderPosition.objects.bulk_create([OrderPosition(order=order, product=product, amount=1)
+                                               for product in products])
+
+        self.provider = User.objects.create_user('seller@example-email.com', 'verysecret1234',
+                                                 is_active=True, is_provider=True)
+        Provider.objects.create(provider=self.provider, shop=products[0].shop)
+
+    def test_products(self):
+        # товары с категорией (параметры в Product.attributes) + фасеты
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('backend:product-list'), {'page_size': 100})
+        self.assertEqual(len(response.json()['results']), Product.objects.count())
+
+    def test_sparse_products(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('backend:product-list'), {'fields': 'name,price,category'})
+        self.assertEqual(set(response.json()['results'][0]), {'name', 'price', 'category'})
+
+    def test_orders_without_positions(self):
+        self.client.force_authenticate(user=self.customer)
+        # позиции не запрошены - без запроса позиций
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('backend:order-list'), {'expand': ''})
+        self.assertNotIn('positions', response.json()[0])
+
+    def test_basket(self):
+        self.client.force_authenticate(user=self.customer)
+        # магазины товаров в заказах (для ETag) + корзина + позиции с товарами
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('backend:basket'))
+        self.assertEqual(len(response.json()[0]['positions']), Product.objects.count())
+
+    def test_orders(self):
+        self.client.force_authenticate(user=self.customer)
+        # магазины товаров в заказах (для ETag) + заказы + позиции
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('backend:order-list'))
+        self.assertEqual(len(response.json()), 2)
+
+    def test_orders_processing(self):
+        self.client.force_authenticate(user=self.provider)
+        # поставщик + заказы + позиции с товарами
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('backend:order-processing'))
+        self.assertEqual(len(response.json()), 3)
@@ -5,7 +5,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from backend.views import CustomerRegistrationView, \
     CategoryView, ShopView, AccountCustomerDetails, AccountProviderDetails, ProviderPriceUpdate, ConfirmAccount, \
     ProductsViewSet, BasketView, BasketPosition, OrderNew, ConfirmOrder, OrderList, OrderProcessing, \
-    ProviderRegistrationView
+    ProviderRegistrationView, ProviderPriceUpdateStatus
 
 router = DefaultRouter()
 router.register('products', ProductsViewSet, basename='product')
@@ -20,6 +20,7 @@ urlpatterns = [
     path('customer/details', AccountCustomerDetails.as_view(), name='user-details'),
     path('provider/details', AccountProviderDetails.as_view(), name='provider-details'),
     path('price/update', ProviderPriceUpdate.as_view(), name='price-update'),
+    path('price/update/<str:job_id>', ProviderPriceUpdateStatus.as_view(), name='price-update-status'),
     path('categories', CategoryView.as_view(), name='categories'),
     path('shops', ShopView.as_view(), name='shops'),
     path('basket', BasketView.as_view(), name='basket'),
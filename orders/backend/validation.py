@@ -0,0 +1,182 @@
+"""
+Проверка прайс-листа до записи в базу данных.
+
+Товары проверяются пакетами по столбцам: для каждого поля пакета
+значения собираются в список и проверяются одним проходом. Результат -
+компактный отчет с ошибками по строкам; прайс с ошибками не импортируется.
+"""
+from django.conf import settings
+
+from backend.models import Shop, Category, Product, Parameter, ProductParameter
+from backend.price_parser import iter_price_list, iter_document, iter_batches
+
+# верхняя граница PositiveIntegerField в PostgreSQL
+MAX_INTEGER = 2147483647
+INTEGER_FIELDS = ('id', 'category', 'price', 'price_rrc', 'quantity')
+STRING_FIELDS = {
+    'name': Product._meta.get_field('name').max_length,
+    'model': Product._meta.get_field('model').max_length,
+}
+REQUIRED_FIELDS = INTEGER_FIELDS + tuple(STRING_FIELDS) + ('parameters',)
+PARAMETER_NAME_LENGTH = Parameter._meta.get_field('name').max_length
+PARAMETER_VALUE_LENGTH = ProductParameter._meta.get_field('value').max_length
+CATEGORY_NAME_LENGTH = Category._meta.get_field('name').max_length
+SHOP_NAME_LENGTH = Shop._meta.get_field('name').max_length
+
+
+class PriceListValidationError(ValueError):
+    """
+    Прайс-лист не прошел проверку; report - отчет validate_price_list
+    """
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(f"В прайсе {report['invalid_rows']} строк с ошибками из {report['rows']}")
+
+
+def is_integer(value):
+    return type(value) is int and 0 <= value <= MAX_INTEGER
+
+
+class PriceListValidator:
+    """
+    Накапливает ошибки по строкам товаров, проверяя их пакетами
+    """
+
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors or settings.PRICE_IMPORT_MAX_ERRORS
+        self.rows = 0
+        self.errors = {}
+        # ошибки уровня документа (магазин, категории)
+        self.document_errors = []
+        self.shop = None
+        self.categories = set()
+        # ссылки на категории, которых нет в прайсе: row -> id категории
+        self.category_references = {}
+        self.external_ids = {}
+
+    def add_error(self, row, external_id, field, message):
+        self.errors.setdefault(row, {'row': row, 'id': external_id, 'errors': {}})['errors'][field] = message
+
+    def check_categories(self, categories):
+        for category in categories:
+            if not isinstance(category, dict) or not is_integer(category.get('id')):
+                self.document_errors.append(f'Неверная категория: {category!r}')
+                continue
+            name = category.get('name')
+            if not isinstance(name, str) or not 0 < len(name) <= CATEGORY_NAME_LENGTH:
+                self.document_errors.append(f"Неверное название категории {category['id']}")
+            self.categories.add(category['id'])
+
+    def check_goods(self, goods):
+        rows = range(self.rows + 1, self.rows + len(goods) + 1)
+        self.rows += len(goods)
+
+        if not all(isinstance(item, dict) for item in goods):
+            for row, item in zip(rows, goods):
+                if not isinstance(item, dict):
+                    self.add_error(row, None, 'row', 'Строка товара должна быть словарем')
+            rows = [row for row, item in zip(rows, goods) if isinstance(item, dict)]
+            goods = [item for item in goods if isinstance(item, dict)]
+
+        ids = [item.get('id') for item in goods]
+        columns = {field: [item.get(field) for item in goods] for field in REQUIRED_FIELDS}
+
+        for field, column in columns.items():
+            for index in [index for index, value in enumerate(column) if value is None]:
+                self.add_error(rows[index], ids[index], field, 'Обязательное поле')
+
+        for field in INTEGER_FIELDS:
+            for index in [index for index, value in enumerate(columns[field])
+                          if value is not None and not is_integer(value)]:
+                self.add_error(rows[index], ids[index], field, f'Ожидается целое число от 0 до {MAX_INTEGER}')
+
+        for field, max_length in STRING_FIELDS.items():
+            for index in [index for index, value in enumerate(columns[field]) if value is not None
+                          and (not isinstance(value, str) or not 0 < len(value) <= max_length)]:
+                self.add_error(rows[index], ids[index], field, f'Ожидается строка длиной до {max_length}')
+
+        for index, parameters in enumerate(columns['parameters']):
+            if parameters is None:
+                continue
+            if not isinstance(parameters, dict):
+                self.add_error(rows[index], ids[index], 'parameters', 'Ожидается словарь параметров')
+            elif any(not isinstance(name, str) or len(name) > PARAMETER_NAME_LENGTH
+                     or isinstance(value, (dict, list)) or len(str(value)) > PARAMETER_VALUE_LENGTH
+                     for name, value in parameters.items()):
+                self.add_error(rows[index], ids[index], 'parameters',
+                               f'Имя параметра - строка до {PARAMETER_NAME_LENGTH} символов, '
+                               f'значение - скаляр до {PARAMETER_VALUE_LENGTH} символов')
+
+        for index, category_id in enumerate(columns['category']):
+            if is_integer(category_id) and category_id not in self.categories:
+                self.category_references[rows[index]] = (ids[index], category_id)
+
+        for row, external_id in zip(rows, ids):
+            if not is_integer(external_id):
+                continue
+            if external_id in self.external_ids:
+                self.add_error(row, external_id, 'id', f'Повтор id строки {self.external_ids[external_id]}')
+            else:
+                self.external_ids[external_id] = row
+
+    def check_category_references(self):
+        """
+        Категории, не описанные в прайсе, должны уже быть в базе (запрос только на чтение)
+        """
+        unknown = {category_id for _, category_id in self.category_references.values()} - self.categories
+        if not unknown:
+            return
+        known = set(Category.objects.filter(id__in=unknown).values_list('id', flat=True))
+        for row, (external_id, category_id) in self.category_references.items():
+            if category_id not in known and category_id not in self.categories:
+                self.add_error(row, external_id, 'category', f'Неизвестная категория {category_id}')
+
+    def report(self):
+        rows = sorted(self.errors.values(), key=lambda item: item['row'])
+        document = [{'row': None, 'id': None, 'errors': {'document': error}} for error in self.document_errors]
+        return {'rows': self.rows,
+                'invalid_rows': len(rows) + len(document),
+                'errors': (document + rows)[:self.max_errors]}
+
+
+def validate_price_list(source, batch_size=None, max_errors=None, shop=None):
+    """
+    Проверяет прайс (словарь документа, файл или байты YAML) и возвращает отчет
+    {'rows': ..., 'invalid_rows': ..., 'errors': [...]}; позиция файла возвращается в начало.
+    Если указан shop, прайс должен относиться к этому магазину
+    """
+    batch_size = batch_size or settings.PRICE_IMPORT_BATCH_SIZE
+    records = iter_document(source) if isinstance(source, dict) else iter_price_list(source)
+    validator = PriceListValidator(max_errors)
+
+    for key, value in iter_batches(records, batch_size):
+        if key == 'shop':
+            validator.shop = value
+        elif key == 'categories':
+            validator.check_categories(value)
+        elif key == 'goods':
+            if validator.shop is None:
+                validator.document_errors.append('Магазин должен быть указан до списка товаров')
+                break
+            validator.check_goods(value)
+
+    if not isinstance(validator.shop, str) or not 0 < len(validator.shop) <= SHOP_NAME_LENGTH:
+        validator.document_errors.append(f'Не указан магазин или название длиннее {SHOP_NAME_LENGTH} символов')
+    elif shop is not None and validator.shop != shop.name:
+        validator.document_errors.append(f'Прайс магазина {validator.shop}, ожидается {shop.name}')
+    validator.check_category_references()
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return validator.report()
+
+
+def ensure_valid_price_list(source, shop=None):
+    """
+    Поднимает PriceListValidationError, если в прайсе есть ошибки
+    """
+    report = validate_price_list(source, shop=shop)
+    if report['invalid_rows']:
+        raise PriceListValidationError(report)
+    return report
@@ -1,27 +1,99 @@
+import gzip
+from datetime import timedelta
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
-from django.db.models import Q, Count
-from django.http import JsonResponse
-from requests import get
+from django.db.models import Q, Count, Prefetch, F
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from rest_auth.registration.views import RegisterView
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView
+from rest_framework.pagination import Cursor
 from rest_framework.response import Response
-from rest_framework.throttling import UserRateThrottle, AnonRateThrottle
+from rest_framework.throttling import UserRateThrottle, AnonRateThrottle, ScopedRateThrottle
 from rest_framework.views import APIView
 from rest_framework.viewsets import ReadOnlyModelViewSet
-from yaml import load as load_yaml, Loader
 
-from backend.models import Category, Shop, Customer, User, Provider, Parameter, ProductParameter, Product, \
-    ConfirmEmailToken, Order, OrderPosition, ConfirmOrderToken
+from backend.autocomplete import suggest
+from backend.cache import cached_response, conditional, product_scopes, orders_scope
+from backend.export import export_catalog, EXPORT_FORMATS
+from backend.fast_serializers import CategoryRowSerializer, ShopRowSerializer, ProductRowSerializer, \
+    OrderRowSerializer
+from backend.facets import product_filters, product_facets, parse_int
+from backend.models import Category, Shop, Customer, User, Provider, Product, \
+    ConfirmEmailToken, Order, OrderPosition, ConfirmOrderToken, PriceImportJob, PriceListSource
+from backend.pagination import ProductCursorPagination, ProductSearchPagination
 from backend.serializers import (LoginSerializer, CustomerSerializer, CategorySerializer, ShopSerializer,
                                  ProviderSerializer, ProductSerializer, OrderSerializer,
-                                 CustomerRegistrationSerializer, ProviderRegistrationSerializer)
-from backend.tasks import new_user_registered, new_order_created
+                                 CustomerRegistrationSerializer, ProviderRegistrationSerializer, requested_fields)
+from backend.snapshots import find_snapshot, dumps
+from backend.tasks import new_user_registered, new_order_created, do_import
 
 
 # from backend.signals import new_user_registered, new_order
 
+# позиции заказа вместе с товаром одним запросом: OrderPositionSerializer выводит название товара
+ORDER_POSITIONS_PREFETCH = Prefetch('positions',
+                                    queryset=OrderPosition.objects.select_related('product').order_by('id'))
+
+# параметры списка товаров, при которых ответ может быть отдан из снимка каталога
+SNAPSHOT_QUERY_PARAMS = {'shop_id', 'category_id', 'page_size'}
+
+# столбцы Product, которые нужны полям ProductSerializer
+PRODUCT_FIELD_COLUMNS = {
+    'name': ('name',),
+    'model': ('model',),
+    'price': ('price',),
+    'price_rrc': ('price_rrc',),
+    'quantity': ('quantity',),
+    'category': ('category',),
+    'shop': ('shop',),
+    'parameters': ('attributes',),
+}
+
+
+def snapshot_response(request, snapshot, next_link):
+    """
+    Ответ из сжатого снимка каталога: к ссылке next добавляется сохраненная часть ответа
+    """
+    content = b'{"next":' + dumps(next_link) + b',' + gzip.decompress(bytes(snapshot.content))
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(gzip.compress(content), content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def prefetch_positions(queryset, request):
+    """
+    Позиции заказов загружаются, только если не отключены через ?fields= или ?expand=
+    """
+    if 'positions' in requested_fields(request, OrderSerializer):
+        return queryset.prefetch_related(ORDER_POSITIONS_PREFETCH)
+    return queryset
+
+
+def order_scopes(request):
+    """
+    Области ответа с заказами пользователя: его заказы и, если выводятся позиции, магазины их товаров -
+    импорт прайса меняет названия товаров, не затрагивая заказы
+    """
+    scopes = orders_scope(request)
+    if request.user.is_authenticated and 'positions' in requested_fields(request, OrderSerializer):
+        shop_ids = (Product.objects
+                    .filter(order_positions__order__user_id=request.user.id)
+                    .order_by('shop_id')
+                    .values_list('shop_id', flat=True)
+                    .distinct())
+        scopes.extend(f'shop:{shop_id}' for shop_id in shop_ids)
+    return scopes
+
 
 class CustomerRegistrationView(RegisterView):
     """
@@ -162,36 +234,62 @@ class ProviderPriceUpdate(APIView):
             except ValidationError as e:
                 return JsonResponse({'Status': False, 'Error': str(e)})
             else:
-                stream = get(url).content
-
-                data = load_yaml(stream, Loader=Loader)
-
-                shop = Shop.objects.get_or_create(name=data['shop'])
-
-                for category in data['categories']:
-                    category_object, _ = Category.objects.get_or_create(id=category['id'], name=category['name'])
-                for item in data['goods']:
-                    product, _ = Product.objects.get_or_create(external_id=item['id'],
-                                                               name=item['name'],
-                                                               category_id=item['category'],
-                                                               model=item['model'],
-                                                               price=item['price'],
-                                                               price_rrc=item['price_rrc'],
-                                                               quantity=item['quantity'],
-                                                               shop_id=shop[0].id
-                                                               )
-                    #
-                    for name, value in item['parameters'].items():
-                        parameter_object, _ = Parameter.objects.get_or_create(name=name)
-                        ProductParameter.objects.create(product_id=product.id,
-                                                        parameter_id=parameter_object.id,
-                                                        value=value)
-
-                return JsonResponse({'Status': True})
+                provider = Provider.objects.filter(provider_id=request.user.id).select_related('shop').first()
+                if provider is None:
+                    return JsonResponse({'Status': False, 'Error': 'Поставщик не привязан к магазину'}, status=403)
+
+                # адрес запоминается для фоновой синхронизации прайса; у магазина один источник
+                shop = provider.shop
+                PriceListSource.objects.get_or_create(shop=shop, url=url)
+                shop.price_sources.exclude(url=url).delete()
+                shop.next_sync_at = timezone.now() + timedelta(minutes=shop.sync_interval)
+                shop.save(update_fields=['next_sync_at'])
+
+                job = do_import.delay(url=url, user_id=request.user.id)
+                # состояние задачи показывается только запустившему её поставщику
+                PriceImportJob.objects.create(job_id=job.id, user=request.user)
+
+                return JsonResponse({'Status': True, 'Job': job.id}, status=202)
 
         return JsonResponse({'Status': False, 'Errors': 'Не указаны все необходимые аргументы'})
 
 
+class ProviderPriceUpdateStatus(APIView):
+    """
+    Класс для просмотра состояния задачи импорта прайса
+    """
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'price-status'
+
+    def get(self, request, job_id, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
+
+        if not request.user.is_provider:
+            return JsonResponse({'Status': False, 'Error': 'Только для поставщиков'}, status=403)
+
+        if not PriceImportJob.objects.filter(job_id=job_id, user_id=request.user.id).exists():
+            return JsonResponse({'Status': False, 'Error': 'Задача не найдена'}, status=404)
+
+        job = do_import.AsyncResult(job_id)
+        info = job.info if isinstance(job.info, dict) else {}
+
+        if job.state == 'PENDING':
+            phase, errors = 'queued', []
+        elif job.state == 'FAILURE':
+            phase, errors = 'failed', [str(job.info)]
+        else:
+            phase, errors = info.get('phase'), info.get('errors', [])
+
+        return JsonResponse({'Status': True,
+                             'Job': job_id,
+                             'phase': phase,
+                             'processed': info.get('processed', 0),
+                             'rows_per_second': info.get('rows_per_second', 0),
+                             'errors': errors,
+                             'result': info.get('result')})
+
+
 class CategoryView(ListAPIView):
     """
     Класс для просмотра категорий товаров
@@ -200,6 +298,13 @@ class CategoryView(ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+    @conditional(lambda request: ['categories'])
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'categories', ['categories'], lambda: self.list_categories(request))
+
+    def list_categories(self, request):
+        return Response(CategoryRowSerializer(request).data(self.filter_queryset(self.get_queryset())))
+
 
 class ShopView(ListAPIView):
     """
@@ -209,6 +314,13 @@ class ShopView(ListAPIView):
     queryset = Shop.objects.filter(state=True)
     serializer_class = ShopSerializer
 
+    @conditional(lambda request: ['shops'])
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'shops', ['shops'], lambda: self.list_shops(request))
+
+    def list_shops(self, request):
+        return Response(ShopRowSerializer(request).data(self.filter_queryset(self.get_queryset())))
+
 
 class ProductsViewSet(ReadOnlyModelViewSet):
     """
@@ -216,9 +328,26 @@ class ProductsViewSet(ReadOnlyModelViewSet):
     """
     throttle_classes = [UserRateThrottle, AnonRateThrottle]
     serializer_class = ProductSerializer
+    pagination_class = ProductCursorPagination
+    # задается действиями с ScopedRateThrottle (autocomplete); @action принимает только атрибуты класса
+    throttle_scope = None
 
     def get_queryset(self):
-        query = Q(shop__state=True)
+        queryset = Product.objects.filter(shop__state=True, is_active=True)
+
+        # выбираются только столбцы полей, запрошенных через ?fields= и ?expand=
+        fields = requested_fields(self.request, ProductSerializer)
+        queryset = queryset.only(*(column for field in fields for column in PRODUCT_FIELD_COLUMNS[field]))
+        if 'category' in fields:
+            queryset = queryset.select_related('category')
+
+        return queryset
+
+    def catalog_queryset(self):
+        """
+        Товары списка и поиска с фильтрами запроса; неверное значение фильтра - ValueError
+        """
+        query = Q()
         shop_id = self.request.query_params.get('shop_id')
         category_id = self.request.query_params.get('category_id')
 
@@ -228,9 +357,128 @@ class ProductsViewSet(ReadOnlyModelViewSet):
         if category_id:
             query = query & Q(category_id=category_id)
 
-        queryset = Product.objects.filter(query).prefetch_related('parameters').distinct()
+        filters, self.filtered = product_filters(self.request.query_params)
+        return self.filter_queryset(self.get_queryset().filter(query & filters))
 
-        return queryset
+    @conditional(lambda request: product_scopes(request.query_params))
+    def list(self, request, *args, **kwargs):
+        snapshot = self.find_list_snapshot(request)
+        if snapshot is not None:
+            return snapshot_response(request, snapshot, self.snapshot_next_link(request, snapshot))
+        return cached_response(request, 'products', product_scopes(request.query_params),
+                               lambda: self.list_products(request))
+
+    def find_list_snapshot(self, request):
+        """
+        Снимок первой страницы каталога магазина (или его категории), если запрос без фильтров
+        и курсора и со страницей размера по умолчанию: тогда он совпадает с обычным ответом списка
+        """
+        if not request.query_params.get('shop_id') or set(request.query_params) - SNAPSHOT_QUERY_PARAMS:
+            return None
+        if self.paginator.get_page_size(request) != self.paginator.page_size:
+            return None
+        try:
+            shop_id = parse_int(request.query_params, 'shop_id')
+            category_id = parse_int(request.query_params, 'category_id')
+        except ValueError:
+            # ошибку параметров сообщит обычный путь списка
+            return None
+        return find_snapshot(shop_id, category_id)
+
+    def snapshot_next_link(self, request, snapshot):
+        """
+        Ссылка на вторую страницу, такая же, как у CursorPagination для первой страницы
+        """
+        if snapshot.next_position is None:
+            return None
+        self.paginator.base_url = request.build_absolute_uri()
+        return self.paginator.encode_cursor(Cursor(offset=0, reverse=False, position=snapshot.next_position))
+
+    # список товаров; счетчики фасетов по всей выборке - только на первой странице, без курсора
+    def list_products(self, request):
+        first_page = self.paginator.cursor_query_param not in request.query_params
+        facets = None
+        try:
+            queryset = self.catalog_queryset()
+            if first_page:
+                facets = product_facets(queryset, request.query_params.get('shop_id'),
+                                        request.query_params.get('category_id'), self.filtered)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        rows = ProductRowSerializer(request)
+        queryset = rows.values(queryset)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(rows.to_representation(page))
+            # фасеты не зависят от страницы: следующие страницы их не пересчитывают
+            if first_page:
+                response.data['facets'] = facets
+            return response
+
+        return Response({'results': rows.to_representation(queryset), 'facets': facets})
+
+    # полнотекстовый поиск по названию, модели и значениям параметров, по убыванию релевантности
+    @action(detail=False, pagination_class=ProductSearchPagination)
+    @conditional(lambda request: product_scopes(request.query_params))
+    def search(self, request, *args, **kwargs):
+        return cached_response(request, 'products-search', product_scopes(request.query_params),
+                               lambda: self.search_products(request))
+
+    def search_products(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return JsonResponse({'Status': False, 'Error': 'Не указан поисковый запрос q'}, status=400)
+
+        # конфигурация должна совпадать с триггером search_vector (миграция 0027)
+        query = SearchQuery(text, config='russian', search_type='websearch')
+        try:
+            queryset = (self.catalog_queryset()
+                        .filter(search_vector=query)
+                        .annotate(rank=SearchRank(F('search_vector'), query))
+                        .order_by('-rank', 'id'))
+            page = self.paginate_queryset(queryset)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    # потоковая выгрузка всего каталога магазина: ?shop_id=<id>&type=ndjson|csv
+    @action(detail=False)
+    def export(self, request, *args, **kwargs):
+        try:
+            shop_id = parse_int(request.query_params, 'shop_id')
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+        if shop_id is None or not Shop.objects.filter(id=shop_id, state=True).exists():
+            return JsonResponse({'Status': False, 'Error': 'Магазин не найден'}, status=404)
+
+        export_format = request.query_params.get('type', 'ndjson')
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        try:
+            chunks = export_catalog(shop_id, export_format, compress=compress)
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="shop-{shop_id}.{export_format}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    # подсказки по названию и модели при вводе, без повторов одной модели
+    @action(detail=False, throttle_classes=[ScopedRateThrottle], throttle_scope='autocomplete')
+    def autocomplete(self, request, *args, **kwargs):
+        try:
+            suggestions = suggest(request.query_params.get('q', ''),
+                                  shop_id=parse_int(request.query_params, 'shop_id'),
+                                  category_id=parse_int(request.query_params, 'category_id'),
+                                  limit=parse_int(request.query_params, 'limit'))
+        except ValueError as error:
+            return JsonResponse({'Status': False, 'Error': str(error)}, status=400)
+        return Response({'results': suggestions})
 
 
 class BasketView(APIView):
@@ -240,16 +488,13 @@ class BasketView(APIView):
     throttle_classes = [UserRateThrottle, AnonRateThrottle]
 
     # получить корзину
+    @conditional(order_scopes)
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return JsonResponse({'Status': False, 'Error': 'Log in required'}, status=403)
-        basket = Order.objects.filter(
-            user_id=request.user.id, status='basket').prefetch_related(
-            'positions__product__category',
-            # 'positions__product__price',
-            'positions__product__parameters').distinct()
+        basket = prefetch_positions(Order.objects.filter(user_id=request.user.id, status='basket'), request)
 
-        serializer = OrderSerializer(basket, many=True)
+        serializer = OrderSerializer(basket, many=True, context={'request': request})
         return Response(serializer.data)
 
 
@@ -334,23 +579,20 @@ class OrderList(ListAPIView):
     Класс для просмотра списка магазинов
     """
     throttle_classes = [UserRateThrottle, AnonRateThrottle]
-    queryset = Order.objects.exclude(status="basket").prefetch_related(
-        # 'positions__product__category',
-        'positions__product')
+    queryset = Order.objects.exclude(status="basket")
 
     serializer_class = OrderSerializer
 
+    @conditional(order_scopes)
     def list(self, request, *args, **kwargs):
-        queryset = self.queryset.filter(user_id=request.user.id)
-        queryset = self.filter_queryset(queryset)
+        rows = OrderRowSerializer(request)
+        queryset = rows.values(self.filter_queryset(self.queryset.filter(user_id=request.user.id)))
 
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(rows.to_representation(page))
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(rows.to_representation(queryset))
 
 
 class OrderProcessing(ListAPIView):
@@ -358,9 +600,7 @@ class OrderProcessing(ListAPIView):
     Класс для просмотра списка заказов для поставщиков
     """
     throttle_classes = [UserRateThrottle, AnonRateThrottle]
-    queryset = Order.objects.exclude(status="basket").prefetch_related(
-        # 'positions__product__category',
-        'positions__product')
+    queryset = Order.objects.exclude(status="basket")
 
     serializer_class = OrderSerializer
 
@@ -376,6 +616,7 @@ class OrderProcessing(ListAPIView):
                     .filter(positions__product__shop_id=shop_id)
                     .annotate(positions__amount=Count('positions'))
                     .filter(positions__amount__gt=0))
+        queryset = prefetch_positions(queryset, request)
 
         queryset = self.filter_queryset(queryset)
 
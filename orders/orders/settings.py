@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     'backend',
     'allauth',
     'allauth.account',
@@ -66,12 +67,40 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '10/day',
-        'user': '100/day'
+        'user': '100/day',
+        'price-status': '60/min',
+        'autocomplete': '120/min',
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': (
+        'backend.renderers.UJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'backend.renderers.UJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 
 }
 
+# размер страницы каталога товаров по умолчанию и максимальный (?page_size=)
+PRODUCTS_PAGE_SIZE = 50
+PRODUCTS_MAX_PAGE_SIZE = 500
+# сколько результатов поиска считать и позволять листать: полный COUNT по всем совпадениям слишком дорог
+PRODUCTS_SEARCH_MAX_RESULTS = 1000
+# сколько товаров читать серверным курсором за раз при выгрузке каталога
+PRODUCTS_EXPORT_CHUNK_SIZE = 2000
+
+# подсказки при вводе: число по умолчанию и максимальное (?limit=), размер кэша префиксов в процессе
+# и время жизни записи кэша в секундах
+PRODUCTS_AUTOCOMPLETE_LIMIT = 10
+PRODUCTS_AUTOCOMPLETE_MAX_LIMIT = 50
+PRODUCTS_AUTOCOMPLETE_CACHE_SIZE = 4096
+PRODUCTS_AUTOCOMPLETE_CACHE_TTL = 60
+# среди скольких лучших совпадений убираются повторы моделей
+PRODUCTS_AUTOCOMPLETE_CANDIDATES = 200
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Test APIs",
     "DESCRIPTION": "Various APIs for Test service",
@@ -161,9 +190,59 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Кэш ответов каталога (категории, магазины, товары) в Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    },
+}
+CATALOG_CACHE_ALIAS = 'catalog'
+# сколько секунд ответ в кэше считается свежим
+CATALOG_CACHE_TTL = 600
+# сколько секунд после этого (или после инвалидации) можно отдавать прежний ответ, пока его пересчитывают
+CATALOG_CACHE_STALE_TTL = 60
+# время жизни блокировки пересчета и сколько секунд ждать пересчета, если прежнего ответа нет
+CATALOG_CACHE_LOCK_TIMEOUT = 30
+CATALOG_CACHE_WAIT = 2
+
 # Celery settings
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
+CELERY_BEAT_SCHEDULE = {
+    'schedule-price-syncs': {
+        'task': 'backend.tasks.schedule_price_syncs',
+        'schedule': 60.0,
+    },
+}
+
+# Price list import settings
+PRICE_IMPORT_BATCH_SIZE = 1000
+PRICE_IMPORT_MAX_DOWNLOAD_SIZE = 500 * 1024 * 1024
+# таймауты (соединение, чтение) при загрузке прайса, секунды
+PRICE_IMPORT_TIMEOUT = (5, 60)
+# сколько версий каталога магазина хранить, включая опубликованную
+PRICE_IMPORT_KEEP_VERSIONS = 2
+# через сколько секунд собранная, но не опубликованная версия каталога считается брошенной
+PRICE_IMPORT_ABANDONED_AFTER = 3600
+# сколько строк с ошибками показывать в отчете проверки прайса
+PRICE_IMPORT_MAX_ERRORS = 100
+
+# Scheduled price sync settings
+# сколько магазинов синхронизируется одновременно
+PRICE_SYNC_CONCURRENCY = 4
+# случайная добавка к интервалу синхронизации, доля интервала
+PRICE_SYNC_JITTER = 0.1
+# первая пауза после неудачной синхронизации, секунды; дальше удваивается
+PRICE_SYNC_RETRY_DELAY = 300
+# через сколько секунд незавершенная синхронизация считается потерянной
+PRICE_SYNC_LEASE = 3600
 
 AUTH_USER_MODEL = "backend.User"
 